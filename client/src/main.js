@@ -3,10 +3,108 @@ import path from 'path';
 import { fileURLToPath } from 'url';
 import fs from 'fs/promises';
 import { spawn } from 'child_process';
+import readline from 'readline';
 
-let watcherProcess = null;
+const projectRoot = path.resolve(path.dirname(fileURLToPath(import.meta.url)), '..', '..');
+
+let daemonProcess = null;
+let watchedDirectory = null;
+let nextRequestId = 1;
+const pendingRequests = new Map();
 let mainWindow = null; // Store the main window globally
 
+function sendToRenderer(channel, message) {
+    if (mainWindow && !mainWindow.isDestroyed()) {
+        mainWindow.webContents.send(channel, message);
+    }
+}
+
+// One long-lived Python daemon (python -m server.daemon) speaks JSON-RPC over
+// stdin/stdout, one message per line; its log output arrives on stderr.
+function startDaemon() {
+    if (daemonProcess) {
+        return daemonProcess;
+    }
+    daemonProcess = spawn(process.platform === 'win32' ? 'python' : 'python3', ['-m', 'server.daemon'], {
+        cwd: projectRoot,
+        env: {
+            ...process.env,
+            PYTHONPATH: projectRoot
+        },
+        stdio: ['pipe', 'pipe', 'pipe']
+    });
+    readline.createInterface({ input: daemonProcess.stdout }).on('line', handleDaemonMessage);
+    daemonProcess.stderr.on('data', (data) => {
+        sendToRenderer('watcher-output', data.toString());
+    });
+    daemonProcess.on('error', (err) => {
+        // Python could not be started; 'close' follows and fails the pending calls
+        console.error(`Cannot start the daemon: ${err.message}`);
+    });
+    daemonProcess.on('close', (code) => {
+        console.log(`Daemon process exited with code ${code}`);
+        daemonProcess = null;
+        for (const { reject } of pendingRequests.values()) {
+            reject(Object.assign(new Error('Daemon exited'), { daemonExited: true }));
+        }
+        pendingRequests.clear();
+        if (watchedDirectory) {
+            watchedDirectory = null;
+            sendToRenderer('watcher-status', 'Watcher stopped');
+        }
+    });
+    return daemonProcess;
+}
+
+// Watcher events arrive as structured data (see server/events.py)
+function renderWatchEvent(event) {
+    if (event.event === 'watch.detected') {
+        sendToRenderer('watcher-output', `[+] New file detected: ${path.basename(event.file)}`);
+    } else if (event.event === 'watch.organized') {
+        sendToRenderer('watcher-output', `[✓] Organized ${path.basename(event.file)} -> ${path.basename(path.dirname(event.dest))}`);
+    } else if (event.event === 'watch.error') {
+        sendToRenderer('watcher-output', `[ERROR] Error moving ${event.file}: ${event.error}`);
+    }
+}
+
+function callDaemon(method, params) {
+    const daemon = startDaemon();
+    const id = nextRequestId++;
+    return new Promise((resolve, reject) => {
+        pendingRequests.set(id, { resolve, reject });
+        daemon.stdin.write(JSON.stringify({ jsonrpc: '2.0', id, method, params }) + '\n');
+    });
+}
+
+function handleDaemonMessage(line) {
+    let message;
+    try {
+        message = JSON.parse(line);
+    } catch (err) {
+        console.error(`Invalid message from daemon: ${line}`);
+        return;
+    }
+    if (message.method === 'events') {
+        // Other events belong to the organize and dedup requests of the renderer
+        if (message.params.watch) {
+            message.params.events.forEach(renderWatchEvent);
+        } else {
+            sendToRenderer('organize-events', message.params.events);
+        }
+        return;
+    }
+    if (message.id === undefined || !pendingRequests.has(message.id)) {
+        return;
+    }
+    const { resolve, reject } = pendingRequests.get(message.id);
+    pendingRequests.delete(message.id);
+    if (message.error) {
+        reject(new Error(message.error.message));
+    } else {
+        resolve(message.result);
+    }
+}
+
 function createWindow() {
     const __filename = fileURLToPath(import.meta.url);
     const __dirname = path.dirname(__filename);
@@ -113,45 +211,51 @@ function createWindow() {
         }
     });
 
+    // Dedup (when asked) and organize through the daemon. Replies with the same
+    // stats the CLI prints, or with fallback set when the daemon is unusable so
+    // the renderer can run python -m server itself.
+    ipcMain.handle('organize-files', async (event, { directory, mode, removeDuplicates }) => {
+        const started = Date.now();
+        const stats = { files_organized: 0, duplicates_removed: 0, space_saved: 0, time_taken: 0 };
+        try {
+            if (removeDuplicates) {
+                const result = await callDaemon('dedup', { path: directory });
+                stats.duplicates_removed = result.duplicates_removed;
+                stats.space_saved = result.space_saved;
+            }
+            const result = await callDaemon('organize', { path: directory, mode });
+            stats.files_organized = result.files_organized;
+        } catch (err) {
+            return { error: err.message, fallback: Boolean(err.daemonExited) };
+        }
+        stats.time_taken = (Date.now() - started) / 1000;
+        return { stats };
+    });
+
     ipcMain.on('start-watcher', (event, { directory, mode }) => {
-        if (watcherProcess) {
+        if (watchedDirectory) {
             event.reply('watcher-status', 'Watcher already running');
             return;
         }
-        const projectRoot = path.resolve(__dirname, '..', '..'); 
-        console.log('Python cwd will be:', projectRoot);
-        
-        watcherProcess = spawn('python3', ['-m', 'server.watcher', directory, mode], {
-            cwd: projectRoot,
-            env: {
-                ...process.env,          
-                PYTHONPATH: projectRoot   
-            },
-            stdio: ['inherit', 'pipe', 'pipe']
-        });
-        watcherProcess.stdout.on('data', (data) => {
-            event.reply('watcher-output', data.toString());
-        });
-        watcherProcess.stderr.on('data', (data) => {
-            event.reply('watcher-output', `Error: ${data.toString()}`);
-        });
-        watcherProcess.on('close', (code) => {
-            console.log(`Watcher process exited with code ${code}`);
-            watcherProcess = null;
-            event.reply('watcher-status', 'Watcher stopped');
-        });
-    
-        event.reply('watcher-status', 'Watcher started');
+        watchedDirectory = directory;
+        callDaemon('watch.add', { path: directory, mode })
+            .then(() => event.reply('watcher-status', 'Watcher started'))
+            .catch((err) => {
+                watchedDirectory = null;
+                event.reply('watcher-output', `Error: ${err.message}`);
+            });
     });
     
     ipcMain.on('stop-watcher', (event) => {
-        if (watcherProcess) {
-            watcherProcess.kill();
-            watcherProcess = null;
-            event.reply('watcher-status', 'Watcher stopped');
-        } else {
+        if (!watchedDirectory) {
             event.reply('watcher-status', 'No watcher running');
+            return;
         }
+        const directory = watchedDirectory;
+        watchedDirectory = null;
+        callDaemon('watch.remove', { path: directory })
+            .then(() => event.reply('watcher-status', 'Watcher stopped'))
+            .catch((err) => event.reply('watcher-output', `Error: ${err.message}`));
     });
 
     if (process.env.NODE_ENV === 'development') {
@@ -168,6 +272,13 @@ app.whenReady().then(() => {
     });
 });
 
+app.on('will-quit', () => {
+    if (daemonProcess) {
+        // Closing stdin makes the daemon stop its watchers and exit
+        daemonProcess.stdin.end();
+    }
+});
+
 app.on('window-all-closed', () => {
     if (process.platform !== 'darwin') {
         app.quit();
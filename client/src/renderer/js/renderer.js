@@ -1118,7 +1118,7 @@ pathInput.addEventListener('keydown', (e) => {
         const input = pathInput.value.trim();
         if (input && !input.startsWith('organize ') && !input.startsWith('mode ') && 
         !input.startsWith('duplicates ') && input !== 'stats' && input !== 'help' && 
-        input !== 'clear') {
+        input !== 'clear' && input !== 'resume' && input !== 'undo') {
             loadFileList(input)
             .then(() => renderFileList())
             .catch(err => writeToOutput(`Error loading files: ${err}`, 'error'));
@@ -1166,6 +1166,8 @@ pathInput.addEventListener('keydown', (e) => {
         } else if (input === 'clear') {
             output.innerHTML = '';
             writeToOutput('Terminal cleared');
+        } else if (input === 'resume' || input === 'undo') {
+            replayJournal(input);
         } else if (input) {
             organizeFiles();
         }
@@ -1174,7 +1176,13 @@ pathInput.addEventListener('keydown', (e) => {
     }
 });
 
-// Organize files function
+// Set when the organizer refused to start because a run on this folder was
+// interrupted; 'resume' or 'undo' then settles it
+let interruptedPath = null;
+
+// Organize files function. Runs through the daemon the main process keeps
+// (dedup first, then organize); python -m server is only spawned when the
+// daemon cannot be reached.
 function organizeFiles() {
     const path = pathInput.value;
     const mode = modeSelect.value;
@@ -1186,24 +1194,63 @@ function organizeFiles() {
         return;
     }
 
-    const pythonCmd = process.platform === 'win32' ? 'python' : 'python3';
-    const args = ['-m', 'server', path, '--mode', mode];
-    if (remove) args.push('--remove-duplicates');
-
-    const pythonProcess = spawn(pythonCmd, args, { cwd: __dirname + '/../../..' });
-
     writeToOutput(`\n[${new Date().toLocaleTimeString()}] Starting file organization...`);
     writeToOutput(`Directory: ${path}`);
     writeToOutput(`Mode: ${mode}`);
     writeToOutput(`Remove duplicates: ${remove ? 'Yes' : 'No'}`);
-    
+
     progressContainer.style.display = 'block';
     progressBar.style.width = '0%';
 
-    let processedFiles = 0;
-    let duplicatesRemoved = 0;
-    let spaceSavedBytes = 0;
-    let newFiles = '';
+    ipcRenderer.invoke('organize-files', { directory: path, mode, removeDuplicates: remove }).then(async (reply) => {
+        if (reply.fallback) {
+            writeToOutput(`Daemon unavailable (${reply.error}), running the organizer directly`, 'warning');
+            organizeWithProcess(path, mode, remove);
+            return;
+        }
+        writeToOutput(`\n[${new Date().toLocaleTimeString()}] Operation completed`);
+        if (reply.error) {
+            writeToOutput(`Error: ${reply.error}`, 'error');
+            await finishOrganize(path, false, null);
+            return;
+        }
+        const stats = reply.stats;
+        writeToOutput(`Report: ${stats.files_organized} files organized, ${stats.duplicates_removed} duplicates removed, ${formatFileSize(stats.space_saved)} saved`, 'success');
+        await finishOrganize(path, true, stats);
+    });
+}
+
+// Events of the organize and dedup requests, forwarded by the main process
+ipcRenderer.on('organize-events', (event, events) => {
+    events.forEach(renderOrganizeEvent);
+});
+
+function renderOrganizeEvent(event) {
+    if (event.event === 'progress' && event.total) {
+        progressBar.style.width = `${Math.round(event.done / event.total * 100)}%`;
+    } else if (event.event === 'organize.start') {
+        writeToOutput(`[+] Organizing ${event.files} files by ${event.mode}...`);
+    } else if (event.event === 'organize.done') {
+        writeToOutput(`[✓] Files organized by ${event.mode}`, 'success');
+    } else if (event.event === 'organize.error') {
+        writeToOutput(`[ERROR] Error moving ${event.file}: ${event.error}`, 'error');
+    } else if (event.event === 'dedup.removed') {
+        writeToOutput(`[-] Removed duplicate: ${event.file} (Size: ${formatFileSize(event.size)})`);
+    } else if (event.event === 'dedup.error') {
+        writeToOutput(`[ERROR] ${event.file}: ${event.error}`, 'error');
+    }
+}
+
+// Fallback: one python -m server process for the job, reporting through its
+// terminal output and the JSON summary line
+function organizeWithProcess(path, mode, remove) {
+    const pythonCmd = process.platform === 'win32' ? 'python' : 'python3';
+    const args = ['-m', 'server', path, '--mode', mode];
+    if (remove) args.push('--remove-duplicates');
+
+    const pythonProcess = spawn(pythonCmd, args, { cwd: __dirname + '/../../..' });
+
+    let stats = null;
 
     pythonProcess.stdout.on('data', (data) => {
         const output = data.toString();
@@ -1212,11 +1259,7 @@ function organizeFiles() {
         lines.forEach(line => {
             if (line.trim().startsWith('{') && line.trim().endsWith('}')) {
                 try {
-                    const stats = JSON.parse(line.trim());
-                    processedFiles = stats.files_organized;
-                    duplicatesRemoved = stats.duplicates_removed;
-                    spaceSavedBytes = stats.space_saved;
-                    newFiles = line.trim();
+                    stats = JSON.parse(line.trim());
                     writeToOutput(`Report: ${stats.files_organized} files organized, ${stats.duplicates_removed} duplicates removed, ${formatFileSize(stats.space_saved)} saved`, 'success');
                 } catch (e) {
                     writeToOutput(`Error parsing stats: ${e.message}`, 'error');
@@ -1236,42 +1279,95 @@ function organizeFiles() {
 
     pythonProcess.on('close', async (code) => {
         writeToOutput(`\n[${new Date().toLocaleTimeString()}] Operation completed with code ${code}`);
-        
-        if (code === 0) {
-            writeToOutput('✅ File organization completed successfully!', 'success');
-            showNotification('File organization completed successfully!', 'success');
-        } else {
-            writeToOutput('❌ Operation failed or had errors.', 'error');
-            showNotification('Operation failed or had errors.', 'error');
+
+        // Status 4: an earlier run on this folder was interrupted and nothing was done
+        if (code === 4) {
+            interruptedPath = path;
+            writeToOutput('⚠ A previous run on this folder was interrupted. Type "resume" to finish it or "undo" to roll it back.', 'warning');
+            showNotification('A previous run was interrupted: resume or undo it first', 'warning');
+            progressContainer.style.display = 'none';
+            return;
         }
 
-        // Update local stats display
-        localStorage.setItem('fileCount', processedFiles);
-        localStorage.setItem('dupCount', duplicatesRemoved);
-        localStorage.setItem('spaceSaved', formatFileSize(spaceSavedBytes));
-        localStorage.setItem('lastRun', new Date().toLocaleString());
-        fileCount.textContent = processedFiles;
-        dupCount.textContent = duplicatesRemoved;
-        spaceSaved.textContent = formatFileSize(spaceSavedBytes);
-        lastRun.textContent = new Date().toLocaleString();
+        await finishOrganize(path, code === 0, stats);
+    });
+}
 
-        // Update analytics.json
-        await updateAnalyticsData(newFiles);
+// Reports the outcome and updates the stats, analytics and file list
+async function finishOrganize(path, success, stats) {
+    if (success) {
+        writeToOutput('✅ File organization completed successfully!', 'success');
+        showNotification('File organization completed successfully!', 'success');
+    } else {
+        writeToOutput('❌ Operation failed or had errors.', 'error');
+        showNotification('Operation failed or had errors.', 'error');
+    }
 
-        progressBar.style.width = '100%';
-        setTimeout(() => {
-            progressContainer.style.display = 'none';
-        }, 2000);
+    const processedFiles = stats ? stats.files_organized : 0;
+    const duplicatesRemoved = stats ? stats.duplicates_removed : 0;
+    const spaceSavedBytes = stats ? stats.space_saved : 0;
 
-        // Reload file list (unchanged for preview)
-        loadFileList(pathInput.value).then(() => {
-            renderFileList();
-            if (fileList.length === 0) {
-                writeToOutput('Note: Files have been organized into subdirectories.', 'warning');
-            }
-        }).catch(err => {
-            writeToOutput(`Error reloading file list: ${err.message}`, 'error');
-        });
+    // Update local stats display
+    localStorage.setItem('fileCount', processedFiles);
+    localStorage.setItem('dupCount', duplicatesRemoved);
+    localStorage.setItem('spaceSaved', formatFileSize(spaceSavedBytes));
+    localStorage.setItem('lastRun', new Date().toLocaleString());
+    fileCount.textContent = processedFiles;
+    dupCount.textContent = duplicatesRemoved;
+    spaceSaved.textContent = formatFileSize(spaceSavedBytes);
+    lastRun.textContent = new Date().toLocaleString();
+
+    // Update analytics.json
+    await updateAnalyticsData(stats ? JSON.stringify(stats) : '');
+
+    progressBar.style.width = '100%';
+    setTimeout(() => {
+        progressContainer.style.display = 'none';
+    }, 2000);
+
+    // Reload file list (unchanged for preview)
+    loadFileList(path).then(() => {
+        renderFileList();
+        if (fileList.length === 0) {
+            writeToOutput('Note: Files have been organized into subdirectories.', 'warning');
+        }
+    }).catch(err => {
+        writeToOutput(`Error reloading file list: ${err.message}`, 'error');
+    });
+}
+
+// Finishes (resume) or rolls back (undo) the interrupted run on interruptedPath.
+// Only offered for a run the organizer reported as interrupted: --undo would
+// otherwise revert the last finished run on whatever folder was given.
+function replayJournal(action) {
+    const path = interruptedPath;
+    if (!path) {
+        writeToOutput(`Error: No interrupted run to ${action}`, 'error');
+        return;
+    }
+    if (action === 'undo' && !confirm(`Move back the files the interrupted run in ${path} already organized?`)) {
+        writeToOutput('Undo cancelled', 'warning');
+        return;
+    }
+
+    const pythonCmd = process.platform === 'win32' ? 'python' : 'python3';
+    const pythonProcess = spawn(pythonCmd, ['-m', 'server', path, `--${action}`], { cwd: __dirname + '/../../..' });
+    writeToOutput(`\n[${new Date().toLocaleTimeString()}] ${action === 'resume' ? 'Resuming' : 'Undoing'} the interrupted run in ${path}...`);
+
+    pythonProcess.stdout.on('data', (data) => writeToOutput(data.toString()));
+    pythonProcess.stderr.on('data', (data) => writeToOutput(`Error: ${data.toString()}`, 'error'));
+    pythonProcess.on('close', (code) => {
+        if (code === 0) {
+            interruptedPath = null;
+            writeToOutput(`✅ Interrupted run ${action === 'resume' ? 'finished' : 'rolled back'}`, 'success');
+            showNotification(`Interrupted run ${action === 'resume' ? 'finished' : 'rolled back'}`, 'success');
+            loadFileList(path).then(() => renderFileList()).catch(err => {
+                writeToOutput(`Error reloading file list: ${err.message}`, 'error');
+            });
+        } else {
+            writeToOutput(`❌ ${action} failed with code ${code}`, 'error');
+            showNotification(`${action} failed`, 'error');
+        }
     });
 }
 
@@ -1,17 +1,33 @@
 import argparse
 import time
 import sys
-from datetime import datetime
-from colorama import init, Fore, Style
-from .ui import print_header
-from .utils import format_file_size
-from .duplicate_remover import remove_duplicates
-from .organizers import organize_by_type, organize_by_date, organize_by_size
 import os
-import json
-from pathlib import Path
 
-init(autoreset=True)
+# Heavy modules are imported inside main() once the options are known, so
+# --help, bad paths and modes that skip dedup or settings never load them.
+# Startup is measured from here: the interpreter's own start-up comes before
+# and is only seen by timing the whole process (server/benchmark.py does).
+STARTED = time.perf_counter()
+
+
+class StartupTimer:
+    # Records how long each lazily imported group of modules took to load
+    def __init__(self):
+        self.timings = {}
+
+    def __call__(self, name):
+        self.current = name
+        return self
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timings[self.current] = round((time.perf_counter() - self.start) * 1000, 1)
+
+
+def elapsed_ms():
+    return (time.perf_counter() - STARTED) * 1000
 
 def main():
     parser = argparse.ArgumentParser(
@@ -19,68 +35,310 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="Example usage:\n  python -m file_organizer ~/Downloads --mode type --remove-duplicates"
     )
-    parser.add_argument("path", help="Path to the directory to organize")
+    parser.add_argument("path", nargs="?", help="Path to the directory to organize")
     parser.add_argument("--mode", choices=['type', 'date', 'size'], default='type', 
                         help="Organizing mode (type, date, or size)")
     parser.add_argument("--remove-duplicates", action="store_true", 
                         help="Remove duplicate files before organizing")
+    parser.add_argument("--dedup-root", metavar="PATH", action="append", default=[],
+                        help="Also look for duplicates in PATH (repeatable); duplicates are searched across all roots")
+    parser.add_argument("--keep", choices=['oldest', 'shortest-path', 'preferred-root'], default='oldest',
+                        help="Which copy of a duplicate survives; ties are broken by path")
+    parser.add_argument("--dedup-action", choices=['delete', 'hardlink', 'reflink'], default='delete',
+                        help="Delete duplicates, or replace them with hard links or reflinks (copy-on-write "
+                             "clones) of the copy kept, so their paths stay valid")
+    parser.add_argument("--prefer-root", metavar="PATH", default=None,
+                        help="With --keep preferred-root: keep copies under PATH (default: the organized path)")
+    parser.add_argument("--no-hash-cache", action="store_true",
+                        help="Hash every file instead of reusing cached hashes")
+    parser.add_argument("--hash-algorithm", choices=['sha256', 'blake2b', 'fast'], default='sha256',
+                        help="Hash used to group duplicates; 'fast' (xxhash or crc32) is always verified")
+    parser.add_argument("--verify", action="store_true",
+                        help="Compare duplicates byte by byte before removing them")
+    parser.add_argument("--near-duplicates", action="store_true",
+                        help="Report images that look alike (resized or recompressed copies) instead of organizing; "
+                             "needs Pillow and NumPy")
+    parser.add_argument("--image-hash", choices=['dhash', 'phash'], default='dhash',
+                        help="With --near-duplicates: perceptual hash to compare images by")
+    parser.add_argument("--max-distance", type=int, default=10,
+                        help="With --near-duplicates: how many of the 64 hash bits two images may differ in "
+                             "(0-15)")
+    parser.add_argument("--hash-backend", choices=['thread', 'process', 'serial'], default='thread',
+                        help="Where full-file hashing runs (threads, worker processes, or in-process)")
+    parser.add_argument("--concurrency", "--io-workers", dest="io_workers", type=int, default=None,
+                        help="Maximum filesystem operations in flight at once")
+    parser.add_argument("--cpu-workers", type=int, default=None,
+                        help="Worker processes for the process hashing backend")
+    parser.add_argument("--classify", choices=['extension', 'auto', 'content'], default='extension',
+                        help="Type mode: use extensions, sniff only unrecognised files, or sniff every file")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Skip files left unchanged since the previous incremental run")
+    parser.add_argument("--since", metavar="TIMESTAMP", default=None,
+                        help="Only organize files modified after this time (epoch seconds, ISO date, or 'last' "
+                             "for the previous incremental run, which needs --incremental)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Report import timings for the selected options and exit without organizing")
+    parser.add_argument("--startup-budget", metavar="MS", type=float, default=None,
+                        help="Exit with status 3 if startup takes longer than this many milliseconds; "
+                             "counted from the import of this module, so interpreter start-up is not included "
+                             "(python -m server.benchmark --startup-budget also reports the whole process)")
+    parser.add_argument("--output", choices=['terminal', 'json', 'none'], default='terminal',
+                        help="Coloured terminal output, newline-delimited JSON events, or nothing")
+    parser.add_argument("--stats", action="store_true",
+                        help="Report per-phase throughput, syscall and byte counters, and latencies")
+    parser.add_argument("--metrics-file", metavar="PATH", default=None,
+                        help="Also write the metrics in Prometheus text format to PATH")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Show what would be moved and removed without changing anything")
+    parser.add_argument("--plan-out", metavar="PLAN", default=None,
+                        help="Dry run that also saves the plan as JSON for --apply")
+    parser.add_argument("--apply", metavar="PLAN", default=None,
+                        help="Carry out a plan saved with --plan-out, without rescanning")
+    parser.add_argument("--recursive", action="store_true",
+                        help="Organize files in subfolders too, skipping the organizer's own output folders")
+    parser.add_argument("--layout", choices=['flatten', 'per-folder'], default='flatten',
+                        help="With --recursive: gather everything under the root, or organize each folder in place")
+    parser.add_argument("--no-journal", action="store_true",
+                        help="Do not record moves and deletes in the recovery journal")
+    parser.add_argument("--resume", action="store_true",
+                        help="Finish the moves and deletes of an interrupted run on this path")
+    parser.add_argument("--undo", action="store_true",
+                        help="Revert the last journaled run on this path")
     args = parser.parse_args()
+    if sum(map(bool, (args.apply, args.dry_run or args.plan_out, args.resume, args.undo, args.near_duplicates))) > 1:
+        parser.error("--apply, --dry-run/--plan-out, --resume, --undo and --near-duplicates cannot be combined")
+    if args.path is None and not args.apply:
+        parser.error("the path argument is required")
+    if args.dedup_root and (args.dry_run or args.plan_out):
+        parser.error("--dedup-root cannot be combined with --dry-run or --plan-out")
+    # near_duplicates.MAX_DISTANCE, not imported here so --help stays free of NumPy
+    if not 0 <= args.max_distance <= 15:
+        parser.error("--max-distance must be between 0 and 15")
+    if args.prefer_root and args.path and os.path.realpath(args.prefer_root) not in \
+            {os.path.realpath(root) for root in [args.path] + args.dedup_root}:
+        parser.error("--prefer-root must be the organized path or one of the --dedup-root paths")
+    if args.recursive and (args.incremental or args.dry_run or args.plan_out):
+        parser.error("--recursive cannot be combined with --incremental, --dry-run or --plan-out")
+    if args.since == 'last' and not args.incremental:
+        parser.error("--since last needs --incremental, which records when the last run was")
 
+    timer = StartupTimer()
+    with timer('output'):
+        from .events import make_reporter
+        if args.output == 'terminal':
+            from colorama import init
+            init(autoreset=True)
+        events = make_reporter(args.output)
+    if args.stats or args.metrics_file:
+        from .metrics import METRICS
+        METRICS.enable()
+    try:
+        organize_directory(args, events, timer)
+    except KeyboardInterrupt:
+        events.emit('run.cancelled')
+        events.close()
+        sys.exit(0)
+    except Exception as e:
+        events.emit('run.failed', error=str(e))
+        events.close()
+        sys.exit(1)
+    events.close()
+
+
+def organize_directory(args, events, timer):
     path = args.path
     mode = args.mode
 
+    with timer('organizers'):
+        from .engine import run
+        from .scanner import count_files
+        from .state import OrganizerState, parse_since
+        from .organizers import organize
+    if args.remove_duplicates:
+        with timer('duplicate_remover'):
+            from .duplicate_remover import dedup
+    if mode == 'type':
+        with timer('settings'):
+            from .categories import get_category_index
+            get_category_index()
+
+    if args.profile_startup:
+        events.emit('run.startup', timings=timer.timings, ready_ms=round(elapsed_ms(), 1))
+    if args.startup_budget is not None and elapsed_ms() > args.startup_budget:
+        events.emit('run.error', message=f"Startup took {elapsed_ms():.1f} ms, "
+                                         f"over the {args.startup_budget:g} ms budget")
+        events.close()
+        sys.exit(3)
+    if args.profile_startup:
+        return
+    if args.apply:
+        apply_saved_plan(args, events)
+        return
+    if args.resume or args.undo:
+        replay_journal(args, events)
+        return
+
     if not os.path.exists(path):
-        print(f"{Fore.RED}[ERROR] The path '{path}' does not exist!")
+        events.emit('run.error', message=f"The path '{path}' does not exist!")
         return
 
-    print_header()
+    if args.near_duplicates:
+        find_similar_images(args, path, events)
+        return
+
+    events.emit('run.start', path=path, mode=mode, remove_duplicates=args.remove_duplicates)
 
-    print(f"{Fore.WHITE}Directory: {Fore.GREEN}{path}")
-    print(f"{Fore.WHITE}Mode: {Fore.GREEN}{mode}")
-    print(f"{Fore.WHITE}Remove Duplicates: {Fore.GREEN}{args.remove_duplicates}")
-    print()
+    state = OrganizerState(path) if args.incremental else None
+    try:
+        since = parse_since(args.since, state)
+    except ValueError:
+        events.emit('run.error', message=f"Invalid --since value '{args.since}'")
+        return
+
+    if args.dry_run or args.plan_out:
+        from .plan import build_plan, save_plan
+
+        async def plan_job(engine):
+            return await build_plan(engine, path, mode, state, since, args.classify, args.remove_duplicates,
+                                    use_cache=not args.no_hash_cache, algorithm=args.hash_algorithm,
+                                    backend=args.hash_backend, events=events, keep=args.keep,
+                                    dedup_action=args.dedup_action, verify=args.verify)
+
+        plan = run(plan_job, args.io_workers, args.cpu_workers)
+        if args.plan_out:
+            save_plan(plan, args.plan_out)
+            events.emit('plan.written', file=args.plan_out)
+        report_metrics(args, events)
+        return
+
+    journal = start_journal(args, path, events)
 
     start_time = time.time()
     stats = {'files_organized': 0, 'duplicates_removed': 0, 'space_saved': 0, 'time_taken': 0}
-    duplicate_count = 0
-    space_saved = 0
-    files_before = len([f for f in Path(path).iterdir() if f.is_file()])
+    files_before = 0 if args.recursive else count_files(path)
 
+    async def run_job(engine):
+        duplicate_count = 0
+        space_saved = 0
+        if args.remove_duplicates:
+            roots = [path] + args.dedup_root if args.dedup_root else path
+            duplicate_count, space_saved = await dedup(engine, roots, use_cache=not args.no_hash_cache,
+                                                       algorithm=args.hash_algorithm,
+                                                       backend=args.hash_backend, events=events,
+                                                       journal=journal, recursive=args.recursive,
+                                                       keep=args.keep, prefer_root=args.prefer_root,
+                                                       action=args.dedup_action, verify=args.verify)
+        if args.recursive:
+            from .recursive import organize_tree
+            counts = await organize_tree(engine, path, mode, args.layout, since, args.classify, events, journal)
+            stats['files_organized'] = sum(counts.values())
+        else:
+            await organize(engine, path, mode, state, since, args.classify, events, journal)
+        if journal is not None:
+            journal.end()
+        return duplicate_count, space_saved
 
-    if args.remove_duplicates:
-        duplicate_count, space_saved = remove_duplicates(path)
-        stats['duplicates_removed'], stats['space_saved'] = remove_duplicates(path)
-
-    if mode == "type":
-        organize_by_type(path)
-    elif mode == "date":
-        organize_by_date(path)
-    elif mode == "size":
-        organize_by_size(path)
-
-    elapsed_time = time.time() - start_time
-    files_after = len([f for f in Path(path).iterdir() if f.is_file()])
-    stats['files_organized'] = files_before - files_after
-    stats['time_taken'] = elapsed_time
-
-    print(json.dumps(stats))
-
-    print(f"\n{Fore.GREEN}{'='*70}")
-    print(f"{Fore.YELLOW}[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Operation completed")
-    print(f"{Fore.CYAN}Total time: {elapsed_time:.2f} seconds")
-    if args.remove_duplicates:
-        print(f"{Fore.CYAN}Duplicates removed: {duplicate_count}")
-        print(f"{Fore.CYAN}Space saved: {format_file_size(space_saved)}")
-    print(f"{Fore.GREEN}{'='*70}")
-    print(f"{Fore.GREEN}[✓] All tasks completed successfully!")
+    try:
+        duplicate_count, space_saved = run(run_job, args.io_workers, args.cpu_workers)
+    finally:
+        # An interrupted run keeps its outcomes so far for --resume / --undo
+        if journal is not None:
+            journal.close()
+    stats['duplicates_removed'], stats['space_saved'] = duplicate_count, space_saved
 
-if __name__ == "__main__":
+    if state is not None:
+        state.save(start_time)
+
+    if not args.recursive:
+        stats['files_organized'] = files_before - count_files(path)
+    stats['time_taken'] = time.time() - start_time
+
+    # Same fields as the JSON line the desktop app has always parsed
+    events.emit('run.summary', **stats)
+    report_metrics(args, events)
+
+
+def apply_saved_plan(args, events):
+    from .engine import run
+    from .plan import load_plan, apply_plan
     try:
-        main()
-    except KeyboardInterrupt:
-        print(f"\n\n{Fore.YELLOW}[!] Operation cancelled by user")
-        print(f"{Fore.GREEN}[✓] Exiting gracefully...")
-        sys.exit(0)
-    except Exception as e:
-        print(f"\n{Fore.RED}[CRITICAL ERROR] {str(e)}")
-        sys.exit(1)
\ No newline at end of file
+        plan = load_plan(args.apply)
+    except (OSError, ValueError) as e:
+        events.emit('run.error', message=f"Cannot load plan: {e}")
+        return
+    if args.path and os.path.abspath(args.path) != plan['root']:
+        events.emit('run.error', message=f"The plan is for '{plan['root']}', not '{args.path}'")
+        return
+
+    journal = start_journal(args, plan['root'], events)
+
+    events.emit('run.start', path=plan['root'], mode=plan['mode'], remove_duplicates=bool(plan['deletes']))
+    start_time = time.time()
+    try:
+        result = run(lambda engine: apply_plan(engine, plan, events, journal), args.io_workers, args.cpu_workers)
+        if journal is not None:
+            journal.end()
+    finally:
+        if journal is not None:
+            journal.close()
+    events.emit('run.summary', files_organized=result['moved'], duplicates_removed=result['removed'],
+                space_saved=result['space_saved'], time_taken=time.time() - start_time)
+    report_metrics(args, events)
+
+
+def find_similar_images(args, path, events):
+    from .engine import run
+    from .near_duplicates import available, find_near_duplicates
+    if not available():
+        events.emit('run.error', message="--near-duplicates needs Pillow and NumPy (pip install Pillow numpy)")
+        return
+    roots = [path] + args.dedup_root if args.dedup_root else path
+    run(lambda engine: find_near_duplicates(engine, roots, not args.no_hash_cache, args.image_hash,
+                                            args.max_distance, args.hash_backend, events=events,
+                                            recursive=args.recursive), args.io_workers, args.cpu_workers)
+    report_metrics(args, events)
+
+
+def start_journal(args, path, events):
+    # Returns the run's Journal, or None with --no-journal. Exits with status 4
+    # when an interrupted run has to be resumed or undone first, so callers
+    # (the desktop app included) can tell that apart from a finished run.
+    if args.no_journal:
+        return None
+    from .journal import Journal, JournalError
+    try:
+        return Journal(path).begin()
+    except (JournalError, OSError) as e:
+        events.emit('run.error', message=str(e))
+        events.close()
+        sys.exit(4)
+
+
+def replay_journal(args, events):
+    from .engine import run
+    from .journal import resume, undo, JournalError
+    if not os.path.isdir(args.path):
+        events.emit('run.error', message=f"The path '{args.path}' does not exist!")
+        return
+    replay = resume if args.resume else undo
+    try:
+        run(lambda engine: replay(engine, args.path, events), args.io_workers, args.cpu_workers)
+    except JournalError as e:
+        events.emit('run.error', message=str(e))
+    report_metrics(args, events)
+
+
+def report_metrics(args, events):
+    if not (args.stats or args.metrics_file):
+        return
+    from .metrics import METRICS
+    if args.stats:
+        events.emit('run.metrics', **METRICS.snapshot())
+    if args.metrics_file:
+        try:
+            METRICS.write_prometheus(args.metrics_file)
+        except OSError as e:
+            events.emit('run.error', message=f"Could not write metrics to '{args.metrics_file}': {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+# server/benchmark.py
+# Reproducible benchmarks: builds synthetic directory trees from a seed, times
+# each organizer mode, dedup and the watcher pipeline, and writes JSON results
+# that can be compared against a saved baseline. CLI start-up is timed in a
+# fresh interpreter and can be held to a budget.
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from statistics import median
+from colorama import init, Fore
+
+DEFAULT_SIZES = '4096:60,262144:30,4194304:10'
+DEFAULT_EXTENSIONS = '.txt:20,.pdf:10,.jpg:20,.png:10,.mp3:10,.mp4:5,.zip:5,.py:10,.bin:5,.xyz:5'
+BENCHMARKS = ['organize_type', 'organize_date', 'organize_size', 'dedup', 'watcher']
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+POOL_SIZE = 8 * 1024 * 1024
+HEADER_SIZE = 32
+
+
+def parse_mix(text, convert):
+    # "a:3,b:1" -> ([convert(a), convert(b)], [3.0, 1.0])
+    values, weights = [], []
+    for item in text.split(','):
+        value, _, weight = item.strip().rpartition(':')
+        if not value:
+            raise ValueError(f"Expected value:weight, got '{item}'")
+        values.append(convert(value))
+        weights.append(float(weight))
+    return values, weights
+
+
+class TreeSpec:
+    # Everything that determines a generated tree; the same spec and seed give
+    # byte-identical trees, so runs on different commits measure the same work.
+    def __init__(self, files=2000, seed=1, duplicate_ratio=0.2, collision_ratio=0.1,
+                 sizes=DEFAULT_SIZES, extensions=DEFAULT_EXTENSIONS):
+        self.files = files
+        self.seed = seed
+        self.duplicate_ratio = duplicate_ratio
+        self.collision_ratio = collision_ratio
+        self.sizes = sizes
+        self.extensions = extensions
+        self.size_limits, self.size_weights = parse_mix(sizes, int)
+        self.extension_names, self.extension_weights = parse_mix(extensions, str)
+
+    def to_dict(self):
+        return {'files': self.files, 'seed': self.seed, 'duplicate_ratio': self.duplicate_ratio,
+                'collision_ratio': self.collision_ratio, 'sizes': self.sizes, 'extensions': self.extensions}
+
+
+def _draw_size(rng, spec):
+    # Sizes are uniform within the bucket picked by weight: (previous limit, limit]
+    limit = rng.choices(spec.size_limits, spec.size_weights)[0]
+    lower = max([0] + [other for other in spec.size_limits if other < limit])
+    return rng.randint(lower + 1, limit)
+
+
+def generate_tree(root, spec, mode=None):
+    # Writes spec.files files into root. Content is a per-file header followed
+    # by a slice of a seeded random pool, so unique files of equal size still
+    # share most bytes and reach the full-hash stage. With mode set, a
+    # collision_ratio share of names is also placed in the folder that mode
+    # would move them to, so the planner has to pick new names.
+    rng = random.Random(spec.seed)
+    pool = rng.getrandbits(POOL_SIZE * 8).to_bytes(POOL_SIZE, 'little')
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    originals = []
+    total_bytes = 0
+    for i in range(spec.files):
+        ext = rng.choices(spec.extension_names, spec.extension_weights)[0]
+        file_path = root / f"file_{i:06d}{ext}"
+        if originals and rng.random() < spec.duplicate_ratio:
+            source = rng.choice(originals)
+            shutil.copyfile(source, file_path)
+            total_bytes += source.stat().st_size
+        else:
+            size = _draw_size(rng, spec)
+            header = f"{spec.seed}:{i}".encode().ljust(HEADER_SIZE, b'.')[:min(size, HEADER_SIZE)]
+            body_size = size - len(header)
+            start = rng.randrange(POOL_SIZE - min(body_size, POOL_SIZE) + 1)
+            with open(file_path, 'wb') as f:
+                f.write(header)
+                while body_size > 0:
+                    chunk = pool[start:start + body_size]
+                    f.write(chunk)
+                    body_size -= len(chunk)
+                    start = 0
+            originals.append(file_path)
+            total_bytes += size
+
+    if mode is not None and spec.collision_ratio:
+        from .organizers import FOLDER_FUNCS
+        folder_for = FOLDER_FUNCS[mode]
+        for file_path in sorted(root.iterdir()):
+            if file_path.is_file() and rng.random() < spec.collision_ratio:
+                dest_dir = root / folder_for(file_path)
+                dest_dir.mkdir(exist_ok=True)
+                (dest_dir / file_path.name).write_bytes(b'existing')
+    return total_bytes
+
+
+def _organize_job(mode):
+    def job(root):
+        from .engine import run
+        from .events import make_reporter
+        from .organizers import organize
+        return run(lambda engine: organize(engine, root, mode, events=make_reporter('none')))
+    return job
+
+
+def _dedup_job(root):
+    from .engine import run
+    from .events import make_reporter
+    from .duplicate_remover import dedup
+    # The hash cache is skipped: it would turn every repeat after the first into a cache benchmark
+    return run(lambda engine: dedup(engine, root, use_cache=False, events=make_reporter('none')))
+
+
+def _watcher_job(root, timeout=300):
+    # Drives the watcher's queue and organizer directly with a created and a
+    # modified event per file, so the numbers do not depend on inotify timing
+    from watchdog.events import FileCreatedEvent, FileModifiedEvent
+    from .events import make_reporter
+    from .watcher import NewFileHandler
+    handler = NewFileHandler('type', root, quiet_period=0, events=make_reporter('none'))
+    files = [entry.path for entry in os.scandir(root) if entry.is_file()]
+    metrics = handler.queue.metrics
+    handler.queue.start()
+    try:
+        for file_path in files:
+            handler.on_created(FileCreatedEvent(file_path))
+            handler.on_modified(FileModifiedEvent(file_path))
+        deadline = time.monotonic() + timeout
+        while metrics.organized + metrics.failed < len(files):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Watcher handled {metrics.organized + metrics.failed} of {len(files)} files")
+            time.sleep(0.005)
+    finally:
+        handler.queue.stop()
+    return len(files) * 2
+
+
+JOBS = {
+    'organize_type': ('type', _organize_job('type')),
+    'organize_date': ('date', _organize_job('date')),
+    'organize_size': ('size', _organize_job('size')),
+    'dedup': (None, _dedup_job),
+    'watcher': ('type', _watcher_job),
+}
+
+
+def run_benchmark(name, spec, repeat=3, base_dir=None):
+    # Each repeat gets a freshly generated tree, since every job changes it;
+    # only the job itself is timed
+    mode, job = JOBS[name]
+    runs = []
+    total_bytes = 0
+    events = None
+    for _ in range(repeat):
+        root = tempfile.mkdtemp(prefix=f"organizer-bench-{name}-", dir=base_dir)
+        try:
+            total_bytes = generate_tree(root, spec, mode)
+            start = time.perf_counter()
+            result = job(root)
+            runs.append(time.perf_counter() - start)
+            if name == 'watcher':
+                events = result
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    seconds = median(runs)
+    result = {'seconds': seconds, 'min': min(runs), 'runs': runs, 'files': spec.files, 'bytes': total_bytes,
+              'files_per_second': spec.files / seconds if seconds else None}
+    if events is not None:
+        result['events_per_second'] = events / seconds if seconds else None
+    return result
+
+
+def measure_startup(repeat=5, mode='type', remove_duplicates=True, base_dir=None):
+    # Starts a real job the way the desktop app does, in a new interpreter, with
+    # --profile-startup so it stops once the organizer, engine, category and
+    # dedup modules are loaded. Returns the job's own ready_ms (time since
+    # server/__main__.py was imported) and the process wall time, which adds
+    # interpreter start-up and exit.
+    root = tempfile.mkdtemp(prefix='organizer-bench-startup-', dir=base_dir)
+    command = [sys.executable, '-m', 'server', root, '--mode', mode, '--profile-startup', '--output', 'json']
+    if remove_duplicates:
+        command.append('--remove-duplicates')
+    runs = []
+    ready = []
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output = subprocess.run(command, cwd=PROJECT_ROOT, stdout=subprocess.PIPE, check=True, text=True).stdout
+            runs.append(time.perf_counter() - start)
+            events = [json.loads(line) for line in output.splitlines() if line.startswith('{')]
+            ready.append(next(event['ready_ms'] for event in events if event['event'] == 'run.startup'))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {'seconds': median(runs), 'min': min(runs), 'runs': runs, 'ready_ms': median(ready)}
+
+
+def run_suite(spec, names=BENCHMARKS, repeat=3, base_dir=None, progress=None):
+    results = {}
+    for name in names:
+        results[name] = run_benchmark(name, spec, repeat, base_dir)
+        if progress:
+            progress(name, results[name])
+    return {'version': 1, 'created': time.time(), 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+            'spec': spec.to_dict(), 'repeat': repeat, 'results': results}
+
+
+def compare(current, baseline, threshold=0.1):
+    # Returns rows of (name, baseline seconds, current seconds, ratio, regressed)
+    # for benchmarks present in both; ratio > 1 + threshold is a regression
+    rows = []
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None or not before['seconds']:
+            continue
+        ratio = result['seconds'] / before['seconds']
+        rows.append((name, before['seconds'], result['seconds'], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the organizers, dedup and the watcher on synthetic trees")
+    parser.add_argument("--files", type=int, default=2000, help="Files per generated tree")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the generated trees")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.2,
+                        help="Share of files that copy an earlier file's content")
+    parser.add_argument("--collision-ratio", type=float, default=0.1,
+                        help="Share of names that already exist in their destination folder")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="Size buckets as max_bytes:weight pairs; sizes are uniform within a bucket")
+    parser.add_argument("--extensions", default=DEFAULT_EXTENSIONS, help="Extension mix as ext:weight pairs")
+    parser.add_argument("--only", default=','.join(BENCHMARKS),
+                        help=f"Comma-separated benchmarks to run ({', '.join(BENCHMARKS)})")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the median is reported")
+    parser.add_argument("--dir", default=None, help="Where to generate trees (default: the system temp dir)")
+    parser.add_argument("--output", metavar="PATH", default=None, help="Write the results as JSON to PATH")
+    parser.add_argument("--baseline", metavar="PATH", default=None, help="Compare against a previous results file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Slowdown ratio over the baseline treated as a regression (0.1 = 10%%)")
+    parser.add_argument("--startup-budget", metavar="MS", type=float, default=None,
+                        help="Also start a type-mode job with duplicate removal in a fresh interpreter and fail "
+                             "if the median time until it is ready to work (ready_ms) exceeds MS milliseconds")
+    args = parser.parse_args()
+    init(autoreset=True)
+
+    names = [name.strip() for name in args.only.split(',') if name.strip()]
+    unknown = [name for name in names if name not in JOBS]
+    if unknown:
+        print(f"{Fore.RED}[ERROR] Unknown benchmark(s): {', '.join(unknown)}")
+        sys.exit(2)
+    try:
+        spec = TreeSpec(args.files, args.seed, args.duplicate_ratio, args.collision_ratio,
+                        args.sizes, args.extensions)
+    except ValueError as e:
+        print(f"{Fore.RED}[ERROR] {e}")
+        sys.exit(2)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('spec') != spec.to_dict():
+            print(f"{Fore.YELLOW}[!] The baseline was generated with a different tree spec")
+
+    def progress(name, result):
+        text = f"{result['seconds']:.3f} s, {result['files_per_second']:.0f} files/s"
+        if 'events_per_second' in result:
+            text += f", {result['events_per_second']:.0f} events/s"
+        print(f"{Fore.CYAN}[BENCH] {name}: {Fore.GREEN}{text}")
+
+    results = run_suite(spec, names, args.repeat, args.dir, progress)
+    over_budget = False
+    if args.startup_budget is not None:
+        startup = results['startup'] = measure_startup(max(args.repeat, 5), base_dir=args.dir)
+        over_budget = startup['ready_ms'] > args.startup_budget
+        color = Fore.RED if over_budget else Fore.GREEN
+        print(f"{Fore.CYAN}[BENCH] startup: {color}ready after {startup['ready_ms']:.1f} ms "
+              f"(budget {args.startup_budget:g} ms){Fore.CYAN}, {startup['seconds'] * 1000:.1f} ms for the process")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"{Fore.GREEN}[✓] Results written to {args.output}")
+
+    if baseline is not None:
+        regressed = False
+        for name, before, after, ratio, slower in compare(results, baseline, args.threshold):
+            color = Fore.RED if slower else Fore.GREEN
+            print(f"{color}  - {name}: {before:.3f} s -> {after:.3f} s ({(ratio - 1) * 100:+.1f}%)")
+            regressed = regressed or slower
+        if regressed:
+            print(f"{Fore.RED}[ERROR] Slower than the baseline by more than {args.threshold * 100:g}%")
+            sys.exit(1)
+        print(f"{Fore.GREEN}[✓] No regressions over {args.threshold * 100:g}%")
+    if over_budget:
+        print(f"{Fore.RED}[ERROR] A job took longer than {args.startup_budget:g} ms to start")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
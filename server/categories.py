@@ -0,0 +1,91 @@
+# server/categories.py
+import os
+import re
+import time
+import threading
+from fnmatch import translate
+from types import MappingProxyType
+from .config import load_settings, SETTINGS_PATH
+
+OTHERS_CATEGORY = 'Others ❓'
+RECHECK_INTERVAL = 1.0
+
+GLOB_CHARS = set('*?[')
+
+
+class CategoryIndex:
+    # Compiled form of the settings' categories. Plain entries (".pdf", ".tar.gz")
+    # go into a case-folded suffix dict; entries containing glob characters or
+    # starting with "re:" become patterns matched against the whole file name.
+    # Earlier categories win, as with the old linear search, whichever kind of
+    # rule matched; among suffixes the longest match is taken.
+    def __init__(self, categories):
+        self.categories = tuple(categories)
+        self.positions = MappingProxyType({category: position for position, category in enumerate(categories)})
+        suffixes = {}
+        patterns = []
+        max_parts = 1
+        for position, (category, rules) in enumerate(categories.items()):
+            for rule in rules:
+                if rule.startswith('re:'):
+                    patterns.append((position, re.compile(rule[3:], re.IGNORECASE).search, False, category))
+                elif GLOB_CHARS & set(rule):
+                    patterns.append((position, re.compile(translate(rule.casefold())).match, True, category))
+                else:
+                    suffix = rule.casefold()
+                    if not suffix.startswith('.'):
+                        suffix = f".{suffix}"
+                    suffixes.setdefault(suffix, category)
+                    max_parts = max(max_parts, suffix.count('.'))
+        self.suffixes = MappingProxyType(suffixes)
+        self.patterns = tuple(patterns)
+        self.max_parts = max_parts
+
+    def classify(self, name):
+        folded = name.casefold()
+        found = None
+        # Mirror Path.suffixes: leading dots are part of the stem, a trailing dot means no suffix
+        stripped = folded.lstrip('.')
+        if '.' in stripped and not stripped.endswith('.'):
+            parts = stripped.split('.')[1:]
+            for count in range(min(self.max_parts, len(parts)), 0, -1):
+                found = self.suffixes.get('.' + '.'.join(parts[-count:]))
+                if found is not None:
+                    break
+        # Patterns are in category order, so only those of earlier categories can win
+        limit = self.positions[found] if found is not None else len(self.categories)
+        for position, matches, on_folded, category in self.patterns:
+            if position >= limit:
+                break
+            if matches(folded if on_folded else name):
+                return category
+        return found or OTHERS_CATEGORY
+
+    def classify_suffix(self, suffix):
+        return self.suffixes.get(suffix.casefold(), OTHERS_CATEGORY)
+
+
+_lock = threading.Lock()
+_cached = {'index': None, 'mtime_ns': None, 'checked': 0.0}
+
+
+def _settings_mtime():
+    try:
+        return os.stat(SETTINGS_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_category_index():
+    # Rebuilt only when settings.json's mtime changes, checked at most once per RECHECK_INTERVAL
+    now = time.monotonic()
+    index = _cached['index']
+    if index is not None and now - _cached['checked'] < RECHECK_INTERVAL:
+        return index
+    with _lock:
+        mtime_ns = _settings_mtime()
+        _cached['checked'] = now
+        if _cached['index'] is None or mtime_ns != _cached['mtime_ns']:
+            _cached['index'] = CategoryIndex(load_settings()['categories'])
+            _cached['mtime_ns'] = mtime_ns
+        return _cached['index']
@@ -4,15 +4,44 @@ from pathlib import Path
 
 CONFIG_PATH = Path(__file__).parent / 'config.json'
 
-with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-    config_data = json.load(f)
+SETTINGS_PATH = os.environ.get('SETTINGS_PATH', 'settings.json')
+SETTINGS_DIR = Path(SETTINGS_PATH).resolve().parent
 
-DEFAULT_CATEGORIES = config_data['DEFAULT_CATEGORIES']
+HASH_CACHE_PATH = os.environ.get('HASH_CACHE_PATH', str(SETTINGS_DIR / 'hash_cache.db'))
 
-SETTINGS_PATH = os.environ.get('SETTINGS_PATH', 'settings.json')
+STATE_PATH = os.environ.get('ORGANIZER_STATE_PATH', str(SETTINGS_DIR / 'organizer_state.json'))
+
+JOURNAL_DIR = os.environ.get('ORGANIZER_JOURNAL_DIR', str(SETTINGS_DIR / 'journals'))
+
+# Values read from config.json, parsed on first access rather than at import
+# so runs that never need them (e.g. date or size mode) skip the file
+CONFIG_VALUES = {
+    'DEFAULT_CATEGORIES': ('DEFAULT_CATEGORIES', None),
+    'HASH_CACHE_MAX_ENTRIES': ('HASH_CACHE_MAX_ENTRIES', 500000),
+    'SIGNATURES': ('SIGNATURES', []),
+    'WATCHER_SETTINGS': ('WATCHER', {}),
+}
+
+_config_data = None
+
+
+def load_config():
+    global _config_data
+    if _config_data is None:
+        with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+            _config_data = json.load(f)
+    return _config_data
+
+
+def __getattr__(name):
+    if name not in CONFIG_VALUES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    key, default = CONFIG_VALUES[name]
+    config_data = load_config()
+    return config_data[key] if default is None else config_data.get(key, default)
 
 def load_settings():
     if os.path.exists(SETTINGS_PATH):
         with open(SETTINGS_PATH, 'r', encoding='utf-8') as f:
             return json.load(f)
-    return {'categories': DEFAULT_CATEGORIES}
+    return {'categories': load_config()['DEFAULT_CATEGORIES']}
@@ -0,0 +1,448 @@
+# server/daemon.py
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from contextlib import redirect_stdout
+from colorama import init, Fore
+from watchdog.observers import Observer
+from .engine import Engine
+from .events import Reporter, BatchingSink
+from .organizers import organize, FOLDER_FUNCS
+from .duplicate_remover import dedup, root_index, KEEP_POLICIES, ACTIONS
+from .hash_cache import HashCache
+from .hashing import ALGORITHMS
+from .metrics import METRICS
+from .executors import BACKENDS
+from .state import OrganizerState, parse_since
+from .watcher import NewFileHandler, QUIET_PERIOD
+
+init(autoreset=True)
+
+# JSON-RPC 2.0 error codes; CANCELLED follows the LSP convention
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+CANCELLED = -32800
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def _error(request_id, code, message):
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+
+class Daemon:
+    # Long-running organizer service. Requests share one engine, one open hash
+    # cache and the process-wide category index and sniffer memo, so only the
+    # first request pays for warming them up. Requests run concurrently;
+    # jobs on the same directory are serialized.
+    def __init__(self, concurrency=None, cpu_workers=None, metrics_file=None):
+        self.engine = Engine(concurrency, cpu_workers)
+        self.metrics_file = metrics_file
+        self.cache = None
+        self.observer = None
+        self.watches = {}
+        self.locks = {}
+        self.jobs = {}
+        self.clients = set()
+        self.started = time.time()
+        self.completed = 0
+        self.stopped = None
+        self.methods = {
+            'organize': self.organize,
+            'dedup': self.dedup,
+            'similar': self.similar,
+            'watch.add': self.watch_add,
+            'watch.remove': self.watch_remove,
+            'watch.list': self.watch_list,
+            'stats': self.stats,
+            'cancel': self.cancel,
+            'shutdown': self.shutdown,
+        }
+
+    # --- helpers
+
+    def _directory(self, params):
+        path = params.get('path')
+        if not isinstance(path, str) or not os.path.isdir(path):
+            raise RpcError(INVALID_PARAMS, f"The path '{path}' is not a directory")
+        return os.path.abspath(path)
+
+    def _choice(self, params, name, choices, default):
+        value = params.get(name, default)
+        if value not in choices:
+            raise RpcError(INVALID_PARAMS, f"Invalid {name} '{value}'. Use: {', '.join(choices)}")
+        return value
+
+    def _lock_for(self, path):
+        return self.locks.setdefault(path, asyncio.Lock())
+
+    def _hash_cache(self):
+        if self.cache is None:
+            self.cache = HashCache()
+        return self.cache
+
+    def _events(self, notify, params):
+        # Event batches become "events" notifications. Flushes from the loop are
+        # sent at once so they precede the response; timer flushes are handed over.
+        loop = asyncio.get_running_loop()
+        loop_thread = threading.get_ident()
+
+        def write(batch):
+            if threading.get_ident() == loop_thread:
+                notify('events', dict(params, events=batch))
+            else:
+                loop.call_soon_threadsafe(notify, 'events', dict(params, events=batch))
+        return Reporter(BatchingSink(write))
+
+    def broadcast(self, method, params):
+        for send in list(self.clients):
+            send({'jsonrpc': '2.0', 'method': method, 'params': params})
+
+    # --- methods
+
+    async def organize(self, params, notify, request_id):
+        path = self._directory(params)
+        mode = self._choice(params, 'mode', list(FOLDER_FUNCS), 'type')
+        classify = self._choice(params, 'classify', ['extension', 'auto', 'content'], 'extension')
+        incremental = bool(params.get('incremental', False))
+        since_value = params.get('since')
+        if since_value == 'last' and not incremental:
+            raise RpcError(INVALID_PARAMS, "since 'last' needs incremental")
+        async with self._lock_for(path):
+            state = OrganizerState(path) if incremental else None
+            try:
+                since = parse_since(since_value, state)
+            except (TypeError, ValueError):
+                raise RpcError(INVALID_PARAMS, f"Invalid since value '{since_value}'")
+            started = time.time()
+            events = self._events(notify, {'id': request_id})
+            try:
+                counts = await organize(self.engine, path, mode, state, since, classify, events)
+            finally:
+                events.close()
+            if state is not None:
+                await self.engine.call(state.save, started)
+        return {'path': path, 'mode': mode, 'files_organized': sum(counts.values()), 'folders': counts}
+
+    async def dedup(self, params, notify, request_id):
+        path = self._directory(params)
+        algorithm = self._choice(params, 'algorithm', list(ALGORITHMS), 'sha256')
+        backend = self._choice(params, 'backend', BACKENDS, 'thread')
+        keep = self._choice(params, 'keep', KEEP_POLICIES, 'oldest')
+        action = self._choice(params, 'action', ACTIONS, 'delete')
+        verify = bool(params.get('verify', False))
+        # Extra roots are searched together with path; the lock covers path only
+        extra_roots = params.get('roots', [])
+        if not isinstance(extra_roots, list):
+            raise RpcError(INVALID_PARAMS, "roots must be a list of directories")
+        roots = [path] + [self._directory({'path': root}) for root in extra_roots]
+        prefer_root = self._directory({'path': params['prefer_root']}) if params.get('prefer_root') else None
+        if prefer_root is not None:
+            try:
+                root_index(roots, prefer_root)
+            except ValueError as e:
+                raise RpcError(INVALID_PARAMS, str(e))
+        cache = self._hash_cache() if params.get('use_cache', True) else None
+        events = self._events(notify, {'id': request_id})
+        async with self._lock_for(path):
+            try:
+                count, saved = await dedup(self.engine, roots, cache is not None, algorithm, backend, cache,
+                                           events, keep=keep, prefer_root=prefer_root, action=action,
+                                           verify=verify)
+            finally:
+                events.close()
+        return {'path': path, 'action': action, 'duplicates_removed': count, 'space_saved': saved}
+
+    async def similar(self, params, notify, request_id):
+        # Near-duplicate images; only reported, so no lock is taken. Imported
+        # here so NumPy and Pillow are not loaded until the first request.
+        from . import near_duplicates
+        if not near_duplicates.available():
+            raise RpcError(INTERNAL_ERROR, "Near-duplicate detection needs Pillow and NumPy")
+        path = self._directory(params)
+        algorithm = self._choice(params, 'algorithm', near_duplicates.IMAGE_HASHES, 'dhash')
+        backend = self._choice(params, 'backend', BACKENDS, 'thread')
+        try:
+            max_distance = int(params.get('max_distance', near_duplicates.DEFAULT_MAX_DISTANCE))
+            if not 0 <= max_distance <= near_duplicates.MAX_DISTANCE:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise RpcError(INVALID_PARAMS, f"Invalid max_distance '{params.get('max_distance')}'")
+        cache = self._hash_cache() if params.get('use_cache', True) else None
+        events = self._events(notify, {'id': request_id})
+        try:
+            groups = await near_duplicates.find_near_duplicates(self.engine, path, cache is not None, algorithm,
+                                                                max_distance, backend, cache, events)
+        finally:
+            events.close()
+        return {'path': path, 'groups': [[{'file': str(file), 'size': size, 'distance': distance}
+                                          for file, size, distance in group] for group in groups]}
+
+    async def watch_add(self, params, notify, request_id):
+        path = self._directory(params)
+        mode = self._choice(params, 'mode', list(FOLDER_FUNCS), 'type')
+        if path in self.watches:
+            raise RpcError(INVALID_PARAMS, f"Already watching {path}")
+        try:
+            quiet_period = float(params.get('quiet_period', QUIET_PERIOD))
+        except (TypeError, ValueError):
+            raise RpcError(INVALID_PARAMS, f"Invalid quiet_period '{params.get('quiet_period')}'")
+        # Watch events go to every connected client
+        events = self._events(self.broadcast, {'watch': path})
+        handler = NewFileHandler(mode, path, quiet_period, events)
+        handler.queue.start()
+        if self.observer is None:
+            self.observer = Observer()
+            self.observer.start()
+        watch = self.observer.schedule(handler, path, recursive=False)
+        self.watches[path] = (handler, watch)
+        print(f"{Fore.CYAN}[+] Watching {path} with mode {mode}")
+        return {'path': path, 'mode': mode, 'quiet_period': quiet_period}
+
+    async def watch_remove(self, params, notify, request_id):
+        path = os.path.abspath(params.get('path') or '')
+        if path not in self.watches:
+            raise RpcError(INVALID_PARAMS, f"Not watching {path}")
+        handler, watch = self.watches.pop(path)
+        self.observer.unschedule(watch)
+        await self.engine.call(handler.queue.stop)
+        handler.events.close()
+        print(f"{Fore.YELLOW}[!] Stopped watching {path}")
+        metrics = handler.queue.metrics
+        return {'path': path, 'organized': metrics.organized, 'failed': metrics.failed}
+
+    async def watch_list(self, params, notify, request_id):
+        return [{'path': path, 'mode': handler.mode} for path, (handler, _) in self.watches.items()]
+
+    async def stats(self, params, notify, request_id):
+        watches = {}
+        for path, (handler, _) in self.watches.items():
+            metrics = handler.queue.metrics
+            watches[path] = {'mode': handler.mode, 'queue': handler.queue.depth(),
+                             'organized': metrics.organized, 'failed': metrics.failed,
+                             'coalesced': metrics.coalesced}
+        stats = {'uptime': time.time() - self.started, 'requests_completed': self.completed,
+                 'requests_running': len(self.jobs), 'concurrency': self.engine.concurrency,
+                 'watches': watches}
+        if self.cache is not None:
+            stats['hash_cache'] = {'hits': self.cache.hits, 'misses': self.cache.misses}
+        if METRICS.enabled:
+            stats['metrics'] = METRICS.snapshot()
+        return stats
+
+    async def cancel(self, params, notify, request_id):
+        task = self.jobs.get(params.get('id'))
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def shutdown(self, params, notify, request_id):
+        self.stopped.set()
+        return True
+
+    # --- transport
+
+    async def handle(self, line, send):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            send(_error(None, PARSE_ERROR, "Parse error"))
+            return
+        if (not isinstance(message, dict) or not isinstance(message.get('method'), str)
+                or not isinstance(message.get('id'), (str, int, type(None)))):
+            send(_error(None, INVALID_REQUEST, "Invalid request"))
+            return
+
+        # Requests without an id are notifications and get no response
+        request_id = message.get('id')
+        method = self.methods.get(message['method'])
+        params = message.get('params', {})
+        if method is None:
+            error = _error(request_id, METHOD_NOT_FOUND, f"Unknown method '{message['method']}'")
+        elif not isinstance(params, dict):
+            error = _error(request_id, INVALID_PARAMS, "params must be an object")
+        else:
+            error = None
+        if error:
+            if request_id is not None:
+                send(error)
+            return
+
+        def notify(name, notify_params):
+            send({'jsonrpc': '2.0', 'method': name, 'params': notify_params})
+
+        if request_id is not None:
+            self.jobs[request_id] = asyncio.current_task()
+        try:
+            response = {'jsonrpc': '2.0', 'id': request_id,
+                        'result': await method(params, notify, request_id)}
+        except asyncio.CancelledError:
+            response = _error(request_id, CANCELLED, "Request cancelled")
+        except RpcError as e:
+            response = _error(request_id, e.code, str(e))
+        except Exception as e:
+            print(f"{Fore.RED}[ERROR] {message['method']} failed: {e}")
+            response = _error(request_id, INTERNAL_ERROR, str(e))
+        finally:
+            self.jobs.pop(request_id, None)
+            self.completed += 1
+            self.write_metrics()
+        if request_id is not None:
+            send(response)
+
+    def _dispatch(self, line, send, requests):
+        if line.strip():
+            task = asyncio.ensure_future(self.handle(line, send))
+            requests.add(task)
+            task.add_done_callback(requests.discard)
+
+    async def serve_stdio(self, requests):
+        # Responses go to stdout, one JSON message per line; log output moves to stderr
+        loop = asyncio.get_running_loop()
+        out = sys.stdout
+
+        def send(message):
+            try:
+                out.write(json.dumps(message, ensure_ascii=False) + '\n')
+                out.flush()
+            except (OSError, ValueError):
+                pass  # client went away; the reader sees EOF and stops the daemon
+
+        def reader():
+            for line in sys.stdin:
+                loop.call_soon_threadsafe(self._dispatch, line, send, requests)
+            loop.call_soon_threadsafe(self.stopped.set)
+
+        self.clients.add(send)
+        threading.Thread(target=reader, name="daemon-stdin", daemon=True).start()
+        with redirect_stdout(sys.stderr):
+            await self.stopped.wait()
+            await self._drain(requests)
+
+    async def serve_socket(self, socket_path, requests):
+        connections = {}
+
+        async def client(reader, writer):
+            def send(message):
+                if not writer.is_closing():
+                    writer.write((json.dumps(message, ensure_ascii=False) + '\n').encode())
+
+            self.clients.add(send)
+            connections[asyncio.current_task()] = writer
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    self._dispatch(line.decode(), send, requests)
+            finally:
+                self.clients.discard(send)
+                connections.pop(asyncio.current_task(), None)
+                writer.close()
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(client, socket_path)
+        os.chmod(socket_path, 0o600)
+        print(f"{Fore.CYAN}[+] Listening on {socket_path}")
+        try:
+            await self.stopped.wait()
+            server.close()
+            await self._drain(requests)
+        finally:
+            server.close()
+            # Closing the transports ends each client loop with EOF
+            for writer in list(connections.values()):
+                writer.close()
+            if connections:
+                await asyncio.gather(*connections, return_exceptions=True)
+            os.unlink(socket_path)
+
+    async def _drain(self, requests):
+        # A shutdown request lets running jobs finish; Ctrl-C cancels them instead
+        if requests:
+            await asyncio.gather(*requests, return_exceptions=True)
+
+    async def serve(self, socket_path=None):
+        self.stopped = asyncio.Event()
+        requests = set()
+        try:
+            if socket_path:
+                await self.serve_socket(socket_path, requests)
+            else:
+                await self.serve_stdio(requests)
+        finally:
+            for task in list(requests):
+                task.cancel()
+            if requests:
+                await asyncio.gather(*requests, return_exceptions=True)
+            self.close_watches()
+
+    def close_watches(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+        for handler, _ in self.watches.values():
+            handler.queue.stop()
+        self.watches.clear()
+
+    def write_metrics(self):
+        if self.metrics_file is None:
+            return
+        try:
+            METRICS.write_prometheus(self.metrics_file)
+        except OSError as e:
+            print(f"{Fore.RED}[ERROR] Could not write metrics to '{self.metrics_file}': {e}", file=sys.stderr)
+
+    def close(self):
+        self.close_watches()
+        self.write_metrics()
+        self.engine.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="File organizer daemon (JSON-RPC 2.0, one message per line)")
+    parser.add_argument("--socket", metavar="PATH", default=None,
+                        help="Listen on a Unix socket instead of stdin/stdout")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Maximum filesystem operations in flight across all requests")
+    parser.add_argument("--cpu-workers", type=int, default=None,
+                        help="Worker processes for the process hashing backend")
+    parser.add_argument("--stats", action="store_true",
+                        help="Collect metrics and include them in the stats method's result")
+    parser.add_argument("--metrics-file", metavar="PATH", default=None,
+                        help="Collect metrics and rewrite PATH in Prometheus text format after each request")
+    args = parser.parse_args()
+
+    if args.socket and not hasattr(asyncio, 'start_unix_server'):
+        print(f"{Fore.RED}[ERROR] Unix sockets are not available on this platform; use stdio")
+        sys.exit(1)
+
+    if args.stats or args.metrics_file:
+        METRICS.enable()
+    daemon = Daemon(args.concurrency, args.cpu_workers, args.metrics_file)
+    try:
+        asyncio.run(daemon.serve(args.socket))
+    except KeyboardInterrupt:
+        print(f"{Fore.YELLOW}[!] Daemon stopped", file=sys.stderr)
+    finally:
+        daemon.close()
+
+
+if __name__ == "__main__":
+    main()
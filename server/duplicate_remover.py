@@ -1,60 +1,496 @@
 # server/duplicate_remover.py
 import os
+import errno
+import shutil
+import contextlib
+from array import array
+from functools import partial
 from pathlib import Path
-from tqdm import tqdm
-from colorama import Fore
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from .utils import hash_file, format_file_size
-
-def remove_duplicates(path):
-    files = [f for f in Path(path).iterdir() if f.is_file()]
-    
-    if not files:
-        print(f"{Fore.YELLOW}[!] No files found in {path}")
-        return 0, 0
-
-    print(f"{Fore.CYAN}[+] Scanning {len(files)} files for duplicates in parallel...")
-    
-    hash_dict = {}
-    total_size = 0
-
-    def process_file(file):
-        file_hash = hash_file(file)
-        return file, file_hash
-
-    # Parallel hashing
-    with ThreadPoolExecutor(max_workers=os.cpu_count() * 2) as executor:
-        future_to_file = {executor.submit(process_file, file): file for file in files}
-        for future in tqdm(as_completed(future_to_file), total=len(files),
-                          desc=f"{Fore.WHITE}Hashing files",
-                          bar_format=f"{Fore.BLUE}{{l_bar}}{Fore.CYAN}{{bar}} {Fore.GREEN}{{n_fmt}}/{Fore.GREEN}{{total_fmt}} [{Fore.YELLOW}{{elapsed}}<{Fore.YELLOW}{{remaining}}] {Fore.MAGENTA}{{percentage:3.0f}}%"):
-            file, file_hash = future.result()
-            if file_hash:
-                if file_hash in hash_dict:
-                    hash_dict[file_hash].append(file)
+from .hash_cache import HashCache
+from .hashing import algorithm_id, digest_file, digest_edges, buffer_size_for, MB
+from .engine import run
+from .events import make_reporter
+from .metrics import inc, phase, phase_files
+from .scanner import scan_entries
+
+EDGE_SIZE = 4 * 1024
+DEDUP_CHUNK = 32
+VERIFY_BUFFER = 1 * MB
+VERIFY_MAX_OPEN = 32
+# Linux ioctl that makes a file share another's extents (Btrfs, XFS, bcachefs, ...)
+FICLONE = 0x40049409
+
+KEEP_POLICIES = ['oldest', 'shortest-path', 'preferred-root']
+ACTIONS = ['delete', 'hardlink', 'reflink']
+
+
+class _Stat:
+    # The stat fields HashCache keys on, rebuilt from the index
+    __slots__ = ('st_dev', 'st_ino', 'st_size', 'st_mtime_ns')
+
+    def __init__(self, dev, ino, size, mtime_ns):
+        self.st_dev, self.st_ino, self.st_size, self.st_mtime_ns = dev, ino, size, mtime_ns
+
+
+class FileIndex:
+    # Every file under the roots, as parallel arrays indexed by file id: one
+    # path string plus a few machine integers per file instead of a Path and a
+    # stat_result. Files reached twice (overlapping roots, hard links) are
+    # indexed once, by (device, inode), under the smallest of their paths, so
+    # one can never be removed as a duplicate of itself. Only those two cases
+    # pay for the identity lookup.
+    def __init__(self, roots):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.overlapping = any(root == other or root.startswith(os.path.join(other, ''))
+                               for i, root in enumerate(self.roots) for other in self.roots[:i] + self.roots[i + 1:])
+        self.paths = []
+        self.root_ids = array('H')
+        self.sizes = array('q')
+        self.mtimes = array('q')
+        self.devs = array('Q')
+        self.inos = array('Q')
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def add(self, path, root_id, st):
+        if st.st_ino and (self.overlapping or st.st_nlink > 1):
+            identity = (st.st_dev, st.st_ino)
+            file_id = self.ids.get(identity)
+            if file_id is not None:
+                if path < self.paths[file_id]:
+                    self.paths[file_id] = path
+                    self.root_ids[file_id] = root_id
+                return
+            self.ids[identity] = len(self.paths)
+        self.paths.append(path)
+        self.root_ids.append(root_id)
+        self.sizes.append(st.st_size)
+        self.mtimes.append(st.st_mtime_ns)
+        self.devs.append(st.st_dev)
+        self.inos.append(st.st_ino)
+
+    def stat(self, file_id):
+        return _Stat(self.devs[file_id], self.inos[file_id], self.sizes[file_id], self.mtimes[file_id])
+
+
+def _count(groups):
+    return sum(len(group) for group in groups)
+
+
+def _digest(hash_func, file_path):
+    # Returns (digest, error) so failures are reported by the caller, not printed in a worker
+    try:
+        return hash_func(file_path), None
+    except OSError as e:
+        return None, e
+
+
+def _scan_root(root, recursive):
+    # Without recursive, the organizer's own folders are scanned as well, so
+    # new files are matched against ones organized by earlier runs
+    from .organizers import output_folder_names, is_output_folder
+    yield from scan_entries(root, recursive=recursive, follow_symlinks=False)
+    if recursive:
+        return
+    names = output_folder_names()
+    try:
+        with os.scandir(root) as it:
+            folders = [entry.path for entry in it
+                       if entry.is_dir(follow_symlinks=False) and is_output_folder(entry.name, names)]
+    except OSError:
+        return
+    for folder in sorted(folders):
+        yield from scan_entries(folder, follow_symlinks=False)
+
+
+def build_index(roots, recursive=False):
+    # Returns (index, files seen, stat errors); also used by near_duplicates
+    index = FileIndex(roots)
+    total = 0
+    errors = []
+    for root_id, root in enumerate(index.roots):
+        for entry in _scan_root(root, recursive):
+            total += 1
+            try:
+                inc('syscalls_total', op='stat')
+                st = entry.stat(follow_symlinks=False)
+            except OSError as e:
+                errors.append((entry.path, e))
+                continue
+            index.add(entry.path, root_id, st)
+    return index, total, errors
+
+
+def _runs(ids, key):
+    # Splits ids, sorted by key, into runs of two or more with equal keys
+    ids = sorted(ids, key=key)
+    runs = []
+    start = 0
+    for i in range(1, len(ids) + 1):
+        if i == len(ids) or key(ids[i]) != key(ids[start]):
+            if i - start > 1:
+                runs.append(ids[start:i])
+            start = i
+    return runs
+
+
+def _size_groups(index):
+    return _runs(array('q', range(len(index))), index.sizes.__getitem__)
+
+
+async def hash_files(engine, index, ids, hash_func, kind, cache, stage, backend, events, bytes_read=None):
+    # Returns {file_id: digest} for the files that could be hashed. Cache
+    # lookups stay in this process; only misses are handed to the engine.
+    # bytes_read(size) is how much of a file of that size the hash reads, for
+    # the metrics.
+    digests = {}
+    misses = []
+    total = len(ids)
+    done = 0
+
+    events.emit('progress', stage=stage, done=0, total=total)
+    with phase(stage):
+        for file_id in ids:
+            cached = cache.get(index.stat(file_id), kind) if cache is not None else None
+            if cached:
+                digests[file_id] = cached
+                done += 1
+            else:
+                misses.append(file_id)
+        if cache is not None:
+            inc('hash_cache_lookups_total', done, result='hit')
+            inc('hash_cache_lookups_total', len(misses), result='miss')
+        if done:
+            events.emit('progress', stage=stage, done=done, total=total)
+
+        async for file_id, (file_hash, error) in engine.map_unordered(partial(_digest, hash_func), misses,
+                                                                      backend, arg=index.paths.__getitem__):
+            inc('syscalls_total', op='open')
+            size = index.sizes[file_id]
+            if error:
+                events.emit('dedup.error', op='hash', file=index.paths[file_id], error=str(error))
+            else:
+                inc('bytes_hashed_total', bytes_read(size) if bytes_read else size, stage=stage)
+                digests[file_id] = file_hash
+                if cache is not None:
+                    cache.put(index.paths[file_id], index.stat(file_id), kind, file_hash)
+            done += 1
+            events.emit('progress', stage=stage, done=done, total=total)
+    phase_files(stage, total)
+    return digests
+
+
+async def _regroup_by_hash(engine, index, groups, hash_func, kind, cache, stage, backend, events,
+                           bytes_read=None):
+    # Splits each group by the hash of its members
+    ids = [file_id for group in groups for file_id in group]
+    digests = await hash_files(engine, index, ids, hash_func, kind, cache, stage, backend, events, bytes_read)
+    regrouped = []
+    for group in groups:
+        hashed = [file_id for file_id in group if file_id in digests]
+        regrouped.extend(_runs(hashed, digests.__getitem__))
+    return regrouped
+
+
+def _compare_files(index, ids):
+    # Reads the files in lock-step and splits them into classes of identical
+    # content as soon as their bytes diverge; a class of one is finished.
+    # Returns (classes, [(file_id, error)], bytes read).
+    buffer_size = min(buffer_size_for(index.sizes[ids[0]]), VERIFY_BUFFER)
+    classes = []
+    errors = []
+    read = 0
+    with contextlib.ExitStack() as stack:
+        members = []
+        for file_id in ids:
+            try:
+                inc('syscalls_total', op='open')
+                afile = stack.enter_context(open(index.paths[file_id], 'rb', buffering=0))
+                members.append((file_id, afile, bytearray(buffer_size)))
+            except OSError as e:
+                errors.append((file_id, e))
+        active = [members] if members else []
+        while active:
+            reading = []
+            for members in active:
+                # (buffer, bytes read, members) per distinct chunk; the first
+                # member's buffer stands for the class while it is compared
+                split = []
+                for member in members:
+                    file_id, afile, buffer = member
+                    try:
+                        inc('syscalls_total', op='read')
+                        n = afile.readinto(buffer)
+                    except OSError as e:
+                        errors.append((file_id, e))
+                        continue
+                    read += n
+                    for other, other_n, same in split:
+                        if n == other_n and (buffer == other if n == buffer_size else buffer[:n] == other[:n]):
+                            same.append(member)
+                            break
+                    else:
+                        split.append((buffer, n, [member]))
+                for _, n, same in split:
+                    if n and len(same) > 1:
+                        reading.append(same)
+                    else:
+                        classes.append([file_id for file_id, _, _ in same])
+                        for _, afile, _ in same:
+                            afile.close()
+            active = reading
+    return classes, errors, read
+
+
+def _verify_group(index, ids):
+    # Like _compare_files, but keeps at most VERIFY_MAX_OPEN files open: large
+    # groups are compared in batches against their first file, and whatever
+    # differs from it is verified again on its own.
+    if len(ids) <= VERIFY_MAX_OPEN:
+        return _compare_files(index, ids)
+    anchor, rest = ids[0], ids[1:]
+    same, leftover, errors, read = [anchor], [], [], 0
+    for start in range(0, len(rest), VERIFY_MAX_OPEN - 1):
+        classes, batch_errors, batch_read = _compare_files(index, [anchor] + rest[start:start + VERIFY_MAX_OPEN - 1])
+        read += batch_read
+        if any(file_id == anchor for file_id, _ in batch_errors):
+            classes, rest_errors, rest_read = _verify_group(index, rest)
+            return classes, errors + batch_errors + rest_errors, read + rest_read
+        errors.extend(batch_errors)
+        for members in classes:
+            if members[0] == anchor:
+                same.extend(members[1:])
+            else:
+                leftover.extend(members)
+    classes, leftover_errors, leftover_read = _verify_group(index, leftover) if leftover else ([], [], 0)
+    return [same] + classes, errors + leftover_errors, read + leftover_read
+
+
+async def _verify_groups(engine, index, groups, backend, events):
+    # Byte-by-byte confirmation of the hash groups, so no file is removed on
+    # the strength of a hash alone
+    verified = []
+    total = _count(groups)
+    done = 0
+    events.emit('progress', stage='verify', done=0, total=total)
+    with phase('verify'):
+        async for group, (classes, errors, read) in engine.map_unordered(partial(_verify_group, index), groups,
+                                                                         backend):
+            for file_id, error in errors:
+                events.emit('dedup.error', op='verify', file=index.paths[file_id], error=str(error))
+            inc('bytes_verified_total', read)
+            verified.extend(members for members in classes if len(members) > 1)
+            done += len(group)
+            events.emit('progress', stage='verify', done=done, total=total)
+    phase_files('verify', total)
+    return verified
+
+
+def root_index(roots, root):
+    # Position of root among roots, compared as resolved paths so symlinked or
+    # relative spellings match; ValueError when it is none of them
+    resolved = [os.path.realpath(candidate) for candidate in roots]
+    try:
+        return resolved.index(os.path.realpath(root))
+    except ValueError:
+        raise ValueError(f"'{root}' is not one of the searched roots: {', '.join(map(str, roots))}") from None
+
+
+def keep_order(index, keep='oldest', prefer_root=None):
+    # Sort key putting the copy to keep first; every policy ends with the path,
+    # so the choice never depends on scan or hashing order
+    def oldest(file_id):
+        return (index.mtimes[file_id], len(index.paths[file_id]), index.paths[file_id])
+
+    if keep == 'shortest-path':
+        return lambda file_id: (len(index.paths[file_id]), index.paths[file_id])
+    if keep == 'preferred-root':
+        preferred_id = root_index(index.roots, prefer_root) if prefer_root else 0
+        return lambda file_id: (index.root_ids[file_id] != preferred_id,) + oldest(file_id)
+    if keep == 'oldest':
+        return oldest
+    raise ValueError(f"Unknown keep policy '{keep}'. Use: {', '.join(KEEP_POLICIES)}")
+
+
+async def find_duplicate_groups(engine, roots, cache=None, algorithm='sha256', backend='thread',
+                                events=None, recursive=False, keep='oldest', prefer_root=None, verify=False):
+    # One pass over all roots: files are indexed once, then narrowed by size,
+    # edge hash and full hash, and with verify compared byte by byte. The
+    # 'fast' hash is not collision resistant, so it is always verified.
+    # Returns lists of Paths, the copy to keep first.
+    events = events or make_reporter('none')
+    verify = verify or algorithm == 'fast'
+    kind = algorithm_id(algorithm)
+    # Edge reads are small and I/O-bound, so they stay on threads unless running serially
+    edge_backend = 'serial' if backend == 'serial' else 'thread'
+    edge_hash = partial(digest_edges, edge_size=EDGE_SIZE, algorithm=algorithm)
+    full_hash = partial(digest_file, algorithm=algorithm)
+
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    with phase('scan'):
+        index, total, errors = await engine.call(build_index, roots, recursive)
+        size_groups = await engine.call(_size_groups, index)
+    phase_files('scan', total)
+    for file, error in errors:
+        events.emit('dedup.error', op='stat', file=file, error=str(error))
+    if total == 0:
+        events.emit('dedup.empty')
+        return []
+    events.emit('dedup.stage', stage='size', before=total, after=_count(size_groups))
+
+    edge_groups = await _regroup_by_hash(engine, index, size_groups, edge_hash, f"edge-{EDGE_SIZE}-{kind}",
+                                         cache, 'edge_hash', edge_backend, events,
+                                         lambda size: min(size, 2 * EDGE_SIZE))
+    events.emit('dedup.stage', stage='edge_hash', before=_count(size_groups), after=_count(edge_groups))
+
+    # Files no larger than both edges were read in full by the edge hash already
+    confirmed = [group for group in edge_groups if index.sizes[group[0]] <= 2 * EDGE_SIZE]
+    pending = [group for group in edge_groups if index.sizes[group[0]] > 2 * EDGE_SIZE]
+
+    full_groups = await _regroup_by_hash(engine, index, pending, full_hash, kind, cache, 'full_hash', backend,
+                                         events)
+    events.emit('dedup.stage', stage='full_hash', before=_count(pending), after=_count(full_groups))
+
+    if cache is not None:
+        # A long-lived cache (see daemon.py) keeps counting across runs
+        events.emit('dedup.cache', hits=cache.hits - hits, misses=cache.misses - misses)
+
+    groups = confirmed + full_groups
+    if verify:
+        # Comparing is I/O-bound like the edge reads
+        verified = await _verify_groups(engine, index, groups, edge_backend, events)
+        events.emit('dedup.stage', stage='verify', before=_count(groups), after=_count(verified))
+        groups = verified
+
+    order = keep_order(index, keep, prefer_root)
+    groups = [sorted(group, key=order) for group in groups]
+    groups.sort(key=lambda group: index.paths[group[0]])
+    return [[Path(index.paths[file_id]) for file_id in group] for group in groups]
+
+
+def as_roots(path):
+    # A single root or an iterable of roots, as a list
+    return [path] if isinstance(path, (str, os.PathLike)) else list(path)
+
+
+async def find_duplicates(engine, path, use_cache=True, algorithm='sha256', backend='thread', cache=None,
+                          events=None, recursive=False, keep='oldest', prefer_root=None, verify=False):
+    # Duplicate groups under path (one root or a list of roots), first file of
+    # each group being the one kept
+    roots = as_roots(path)
+    if cache is not None or not use_cache:
+        groups = await find_duplicate_groups(engine, roots, cache, algorithm, backend, events, recursive,
+                                             keep, prefer_root, verify)
+        if cache is not None:
+            await engine.call(cache.flush)
+        return groups
+    with HashCache() as cache:
+        return await find_duplicate_groups(engine, roots, cache, algorithm, backend, events, recursive,
+                                           keep, prefer_root, verify)
+
+
+def _reflink(keep, tmp):
+    import fcntl
+    inc('syscalls_total', 2, op='open')
+    with open(keep, 'rb') as src, open(tmp, 'xb') as dest:
+        inc('syscalls_total', op='ioctl')
+        fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+
+
+def link_duplicate(keep, dup, action):
+    # Replaces dup with a hard link to keep or a reflinked copy of it. The link
+    # is made under a temporary name next to dup and renamed over it, so dup is
+    # never missing or partially written.
+    tmp = dup.with_name(f".{dup.name}.{os.getpid()}.dedup")
+    try:
+        if action == 'hardlink':
+            inc('syscalls_total', op='link')
+            os.link(keep, tmp)
+        else:
+            _reflink(keep, tmp)
+            shutil.copystat(dup, tmp)
+        inc('syscalls_total', op='rename')
+        os.replace(tmp, dup)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+
+
+def _apply_action(action, job):
+    # Returns (bytes reclaimed, error); space only comes back once no other link holds the data
+    keep, dup = job
+    try:
+        inc('syscalls_total', op='stat')
+        st = os.stat(dup)
+        if action == 'delete':
+            inc('syscalls_total', op='unlink')
+            os.remove(dup)
+        else:
+            link_duplicate(keep, dup, action)
+        return (st.st_size if st.st_nlink == 1 else 0), None
+    except OSError as e:
+        if action == 'reflink' and e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EXDEV):
+            e = OSError(e.errno, "reflinks are not supported here")
+        return 0, e
+    except Exception as e:
+        return 0, e
+
+
+async def dedup(engine, path, use_cache=True, algorithm='sha256', backend='thread', cache=None,
+                events=None, journal=None, recursive=False, keep='oldest', prefer_root=None, action='delete',
+                verify=False):
+    # path may be a list of roots searched together. Pass an open HashCache as
+    # cache to reuse it across calls; otherwise one is opened for this run when
+    # use_cache is set. action is one of ACTIONS: duplicates are removed, or
+    # replaced by links to the copy kept. verify compares candidates byte by
+    # byte before acting on them. Reports through events and records
+    # the changes in journal like organize().
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown dedup action '{action}'. Use: {', '.join(ACTIONS)}")
+    own_events = events is None
+    events = events or make_reporter()
+    try:
+        label = ', '.join(str(root) for root in as_roots(path))
+        events.emit('dedup.start', path=label)
+        groups = await find_duplicates(engine, path, use_cache, algorithm, backend, cache, events, recursive,
+                                       keep, prefer_root, verify)
+        if journal is not None:
+            journal.plan_deletes(groups, action)
+
+        duplicate_count = 0
+        space_saved = 0
+
+        jobs = [(group[0], dup) for group in groups for dup in group[1:]]
+        with phase('remove'):
+            async for (kept, dup), (reclaimed, error) in engine.map_unordered(partial(_apply_action, action), jobs,
+                                                                              chunk_size=DEDUP_CHUNK):
+                if journal is not None:
+                    journal.done(dup, error)
+                if error:
+                    events.emit('dedup.error', op='remove' if action == 'delete' else 'link', file=str(dup),
+                                error=str(error))
+                    continue
+                duplicate_count += 1
+                space_saved += reclaimed
+                if action == 'delete':
+                    events.emit('dedup.removed', file=str(dup), size=reclaimed)
                 else:
-                    hash_dict[file_hash] = [file]
-
-    duplicate_count = 0
-    space_saved = 0
-    
-    for file_hash, file_list in hash_dict.items():
-        if len(file_list) > 1:
-            original = file_list[0]
-            duplicates = file_list[1:]
-            for dup in duplicates:
-                try:
-                    file_size = os.path.getsize(dup)
-                    os.remove(dup)
-                    duplicate_count += 1
-                    space_saved += file_size
-                    print(f"{Fore.YELLOW}[-] Removed duplicate: {dup.name} (Size: {format_file_size(file_size)})")
-                except Exception as e:
-                    print(f"{Fore.RED}[ERROR] Failed to remove {dup}: {e}")
-    
-    if duplicate_count > 0:
-        print(f"\n{Fore.GREEN}[✓] Removed {duplicate_count} duplicates, saved {format_file_size(space_saved)}")
-    else:
-        print(f"\n{Fore.GREEN}[✓] No duplicates found")
-    
-    return duplicate_count, space_saved
\ No newline at end of file
+                    events.emit('dedup.linked', file=str(dup), keep=str(kept), size=reclaimed, action=action)
+        phase_files('remove', len(jobs))
+
+        events.emit('dedup.done', path=label, duplicates_removed=duplicate_count, space_saved=space_saved,
+                    action=action)
+        return duplicate_count, space_saved
+    finally:
+        if own_events:
+            events.close()
+
+
+def remove_duplicates(path, use_cache=True, algorithm='sha256', backend='thread',
+                      io_workers=None, cpu_workers=None, keep='oldest', prefer_root=None, action='delete',
+                      verify=False):
+    return run(lambda engine: dedup(engine, path, use_cache, algorithm, backend, keep=keep, prefer_root=prefer_root,
+                                    action=action, verify=verify), io_workers, cpu_workers)
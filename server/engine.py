@@ -0,0 +1,120 @@
+# server/engine.py
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .executors import BACKENDS, DEFAULT_IO_WORKERS, DEFAULT_CPU_WORKERS
+from .metrics import METRICS, observe
+
+
+def _apply_chunk(func, args):
+    return [func(arg) for arg in args]
+
+
+def _timed(func, queued):
+    # Records how long a call waited for a slot and a thread, and how long it ran
+    def timed(*args):
+        start = time.perf_counter()
+        observe('engine_queue_wait_seconds', start - queued)
+        try:
+            return func(*args)
+        finally:
+            observe('engine_call_seconds', time.perf_counter() - start)
+    return timed
+
+
+class Engine:
+    # Shared asyncio execution engine for organizing and dedup. Blocking
+    # filesystem work is offloaded to a thread pool (or a process pool for
+    # CPU-bound hashing); one semaphore bounds the calls in flight across every
+    # job running on the engine, so several directories can share it.
+    def __init__(self, concurrency=None, cpu_workers=None):
+        self.concurrency = concurrency or DEFAULT_IO_WORKERS
+        self.cpu_workers = cpu_workers or DEFAULT_CPU_WORKERS
+        self._threads = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="engine")
+        self._processes = None
+        self._semaphore = None
+
+    @property
+    def semaphore(self):
+        # Created on first use so it belongs to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def _executor(self, backend):
+        if backend == 'process':
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.cpu_workers)
+            return self._processes
+        return self._threads
+
+    async def call(self, func, *args, backend='thread'):
+        if backend == 'serial':
+            return func(*args)
+        if METRICS.enabled and backend == 'thread':
+            # Process-backend calls are left alone: the wrapper could not be pickled
+            func = _timed(func, time.perf_counter())
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(backend), func, *args)
+
+    async def map_unordered(self, func, items, backend='thread', arg=None, chunk_size=1):
+        # Yields (item, func(arg(item))) as calls finish, with a bounded number
+        # of tasks. chunk_size > 1 hands several items to each executor call,
+        # for cheap calls like renames where the per-call overhead would
+        # dominate. Pending calls are cancelled if the consumer is cancelled or
+        # stops early.
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown executor backend '{backend}'. Use: {', '.join(BACKENDS)}")
+        arg = arg or (lambda item: item)
+
+        async def run(chunk):
+            results = await self.call(_apply_chunk, func, [arg(item) for item in chunk], backend=backend)
+            return zip(chunk, results)
+
+        def chunks():
+            chunk = []
+            for item in items:
+                chunk.append(item)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        limit = self.concurrency * 2
+        pending = set()
+        try:
+            for chunk in chunks():
+                pending.add(asyncio.ensure_future(run(chunk)))
+                if len(pending) >= limit:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        for result in task.result():
+                            yield result
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    for result in task.result():
+                        yield result
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def close(self):
+        self._threads.shutdown(wait=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run(job, concurrency=None, cpu_workers=None):
+    # Runs job(engine) to completion on a fresh engine; used by the synchronous entry points
+    with Engine(concurrency, cpu_workers) as engine:
+        return asyncio.run(job(engine))
@@ -0,0 +1,114 @@
+# server/events.py
+import sys
+import json
+import time
+import threading
+
+FLUSH_INTERVAL = 0.2
+
+
+class Reporter:
+    # Core code describes what happened with emit(kind, **fields) and never
+    # formats text; sinks decide how (or whether) to present it. Events are flat
+    # dicts: {"event": kind, "ts": unix time, **fields}, with JSON-friendly values.
+    def __init__(self, *sinks):
+        self.sinks = list(sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def emit(self, kind, **fields):
+        if not self.sinks:
+            return
+        event = {'event': kind, 'ts': round(time.time(), 3)}
+        event.update(fields)
+        for sink in self.sinks:
+            sink.emit(event)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class NullSink:
+    def emit(self, event):
+        pass
+
+    def close(self):
+        pass
+
+
+class BatchingSink:
+    # Buffers events and hands them to write(batch) at most once per interval;
+    # a timer makes sure a lone event is still delivered within the interval.
+    # Intermediate progress events for the same stage and path are coalesced,
+    # so a fast loop yields a few updates per second instead of one per file.
+    def __init__(self, write, interval=FLUSH_INTERVAL):
+        self.write = write
+        self.interval = interval
+        self.buffer = []
+        self.progress = {}
+        self.last_flush = 0.0
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def emit(self, event):
+        with self.lock:
+            if event['event'] == 'progress':
+                key = (event.get('stage'), event.get('path'))
+                if event['done'] < event['total']:
+                    self.progress[key] = event
+                else:
+                    self.progress.pop(key, None)
+                    self.buffer.append(event)
+            else:
+                self.buffer.append(event)
+            wait = self.interval - (time.monotonic() - self.last_flush)
+            if wait <= 0:
+                self._flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(wait, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch = list(self.progress.values()) + self.buffer
+        self.progress = {}
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        if batch:
+            self.write(batch)
+
+    def close(self):
+        self.flush()
+
+
+class JsonSink(BatchingSink):
+    # Newline-delimited JSON, one event per line
+    def __init__(self, stream=None, interval=FLUSH_INTERVAL):
+        self.stream = stream or sys.stdout
+        super().__init__(self._write, interval)
+
+    def _write(self, batch):
+        self.stream.write(''.join(json.dumps(event, ensure_ascii=False, default=str) + '\n'
+                                  for event in batch))
+        self.stream.flush()
+
+
+OUTPUTS = ['terminal', 'json', 'none']
+
+
+def make_reporter(output='terminal'):
+    if output == 'json':
+        return Reporter(JsonSink())
+    if output == 'none':
+        return Reporter(NullSink())
+    from .ui import TerminalSink
+    return Reporter(TerminalSink())
@@ -0,0 +1,11 @@
+# server/executors.py
+# Backend names and worker defaults for the engine (engine.py), which owns the
+# thread and process pools.
+import os
+
+BACKENDS = ['thread', 'process', 'serial']
+
+CPU_COUNT = os.cpu_count() or 1
+# hashlib and file I/O release the GIL, so threads can usefully exceed the core count
+DEFAULT_IO_WORKERS = min(32, CPU_COUNT * 2)
+DEFAULT_CPU_WORKERS = CPU_COUNT
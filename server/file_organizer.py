@@ -8,6 +8,11 @@ import sys
 from pathlib import Path
 from datetime import datetime
 
+try:
+    from .scanner import scan_entries
+except ImportError:
+    from scanner import scan_entries
+
 try:
     from tqdm import tqdm
     from colorama import Fore, Style, init, Back
@@ -106,8 +111,7 @@ def remove_duplicates(path):
     
     # Get all files recursively
     print(f"{Fore.YELLOW}[+] Scanning for duplicates...")
-    all_files = list(Path(path).rglob('*'))
-    files = [f for f in all_files if f.is_file()]
+    files = [Path(entry.path) for entry in scan_entries(path, recursive=True)]
     
     # Skip if no files
     if not files:
@@ -0,0 +1,145 @@
+# server/hash_cache.py
+import os
+import sys
+import sqlite3
+import threading
+import time
+from colorama import Fore
+from .config import HASH_CACHE_PATH, HASH_CACHE_MAX_ENTRIES
+
+FLUSH_EVERY = 1000
+
+
+class HashCache:
+    # Entries are keyed by (device, inode, kind) and only returned while the
+    # file's size and mtime_ns still match, so modified files miss automatically.
+    def __init__(self, db_path=HASH_CACHE_PATH, max_entries=HASH_CACHE_MAX_ENTRIES):
+        self.db_path = str(db_path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending = []
+        self._touched = []
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " dev INTEGER NOT NULL, ino INTEGER NOT NULL, kind TEXT NOT NULL,"
+            " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL,"
+            " path TEXT NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (dev, ino, kind))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS hashes_last_used ON hashes (last_used)")
+
+    def get(self, st, kind):
+        if not st.st_ino:
+            # Some platforms (e.g. DirEntry.stat() on Windows) report no inode
+            self.misses += 1
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest FROM hashes WHERE dev=? AND ino=? AND kind=? AND size=? AND mtime_ns=?",
+                (st.st_dev, st.st_ino, kind, st.st_size, st.st_mtime_ns)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched.append((time.time(), st.st_dev, st.st_ino, kind))
+            return row[0]
+
+    def put(self, path, st, kind, digest):
+        if not st.st_ino:
+            return
+        with self._lock:
+            self._pending.append((st.st_dev, st.st_ino, kind, st.st_size, st.st_mtime_ns,
+                                  digest, str(path), time.time()))
+            if len(self._pending) >= FLUSH_EVERY:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   self._pending)
+            self._pending = []
+        if self._touched:
+            self._conn.executemany("UPDATE hashes SET last_used=? WHERE dev=? AND ino=? AND kind=?",
+                                   self._touched)
+            self._touched = []
+        self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            self._flush()
+            return self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    def prune(self, check_files=True):
+        # Drop entries whose file is gone or changed, then trim to max_entries by LRU
+        removed = 0
+        with self._lock:
+            self._flush()
+            if check_files:
+                stale = []
+                rows = self._conn.execute("SELECT dev, ino, kind, size, mtime_ns, path FROM hashes")
+                for dev, ino, kind, size, mtime_ns, path in rows:
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        stale.append((dev, ino, kind))
+                        continue
+                    if (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) != (dev, ino, size, mtime_ns):
+                        stale.append((dev, ino, kind))
+                self._conn.executemany("DELETE FROM hashes WHERE dev=? AND ino=? AND kind=?", stale)
+                removed += len(stale)
+
+            total = self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+            excess = total - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM hashes WHERE rowid IN "
+                    "(SELECT rowid FROM hashes ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                removed += excess
+            self._conn.commit()
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._pending = []
+            self._touched = []
+            self._conn.execute("DELETE FROM hashes")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+        if self.count() > self.max_entries:
+            self.prune(check_files=False)
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ['stats', 'prune', 'clear']:
+        print(f"{Fore.RED}[ERROR] Usage: python -m server.hash_cache <stats|prune|clear>")
+        sys.exit(1)
+    with HashCache() as cache:
+        command = sys.argv[1]
+        if command == 'prune':
+            print(f"{Fore.GREEN}[✓] Pruned {cache.prune()} cache entries")
+        elif command == 'clear':
+            cache.clear()
+            print(f"{Fore.GREEN}[✓] Hash cache cleared")
+        print(f"{Fore.CYAN}[STATS] {cache.count()} entries in {cache.db_path}")
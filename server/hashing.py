@@ -0,0 +1,191 @@
+# server/hashing.py
+import os
+import sys
+import mmap
+import time
+import zlib
+import hashlib
+import tempfile
+from colorama import Fore
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+KB = 1024
+MB = 1024 * KB
+
+MMAP_THRESHOLD = 64 * MB
+PROGRESS_STEP = 32 * MB
+
+MODES = ['auto', 'readinto', 'mmap', 'file_digest']
+
+
+class Crc32Hasher:
+    # Non-cryptographic pre-hash used when xxhash is not installed
+    name = 'crc32'
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        return f"{self.value:08x}"
+
+
+def _new_fast():
+    if xxhash is not None:
+        return xxhash.xxh3_64()
+    return Crc32Hasher()
+
+
+ALGORITHMS = {
+    'sha256': hashlib.sha256,
+    'blake2b': hashlib.blake2b,
+    'fast': _new_fast,
+}
+
+
+def new_hasher(algorithm='sha256'):
+    try:
+        return ALGORITHMS[algorithm]()
+    except KeyError:
+        raise ValueError(f"Unknown hash algorithm '{algorithm}'. Use: {', '.join(ALGORITHMS)}")
+
+
+def algorithm_id(algorithm):
+    # Concrete digest name, so cached 'fast' digests are not mixed across backends
+    return getattr(new_hasher(algorithm), 'name', algorithm)
+
+
+def buffer_size_for(file_size):
+    if file_size < 1 * MB:
+        return 64 * KB
+    if file_size < 64 * MB:
+        return 1 * MB
+    return 4 * MB
+
+
+def _hash_readinto(afile, hasher, file_size, progress):
+    buffer = bytearray(buffer_size_for(file_size))
+    view = memoryview(buffer)
+    processed = 0
+    next_report = PROGRESS_STEP
+    while n := afile.readinto(buffer):
+        hasher.update(view[:n])
+        processed += n
+        if progress is not None and processed >= next_report:
+            progress(processed, file_size)
+            next_report = processed + PROGRESS_STEP
+
+
+def _hash_mmap(afile, hasher, file_size, progress):
+    if file_size == 0:
+        return
+    step = buffer_size_for(file_size) * 4
+    with mmap.mmap(afile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            next_report = PROGRESS_STEP
+            for offset in range(0, file_size, step):
+                hasher.update(view[offset:offset + step])
+                if progress is not None and offset >= next_report:
+                    progress(offset, file_size)
+                    next_report = offset + PROGRESS_STEP
+        finally:
+            view.release()
+
+
+def _resolve_mode(mode, file_size):
+    if mode == 'auto':
+        if file_size >= MMAP_THRESHOLD:
+            return 'mmap'
+        if hasattr(hashlib, 'file_digest'):
+            return 'file_digest'
+        return 'readinto'
+    if mode == 'file_digest' and not hasattr(hashlib, 'file_digest'):
+        return 'readinto'
+    return mode
+
+
+def digest_file(file_path, algorithm='sha256', mode='auto', progress=None):
+    # Raises OSError; callers decide how to report failures
+    hasher = new_hasher(algorithm)
+    file_size = os.path.getsize(file_path)
+    mode = _resolve_mode(mode, file_size)
+    with open(file_path, 'rb', buffering=0) as afile:
+        if mode == 'file_digest':
+            hasher = hashlib.file_digest(afile, lambda: hasher)
+        elif mode == 'mmap':
+            _hash_mmap(afile, hasher, file_size, progress)
+        else:
+            _hash_readinto(afile, hasher, file_size, progress)
+    if progress is not None:
+        progress(file_size, file_size)
+    return hasher.hexdigest()
+
+
+def digest_edges(file_path, edge_size=4096, algorithm='sha256'):
+    # Hash of the first and last edge_size bytes; raises OSError like digest_file
+    hasher = new_hasher(algorithm)
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as afile:
+        hasher.update(afile.read(edge_size))
+        if file_size > edge_size:
+            afile.seek(max(edge_size, file_size - edge_size))
+            hasher.update(afile.read(edge_size))
+    return hasher.hexdigest()
+
+
+def benchmark(file_path, algorithms=None, modes=None, repeat=3):
+    file_size = os.path.getsize(file_path)
+    results = []
+    for algorithm in algorithms or list(ALGORITHMS):
+        for mode in modes or MODES[1:]:
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                digest_file(file_path, algorithm, mode)
+                best = min(best, time.perf_counter() - start)
+            results.append({
+                'algorithm': algorithm,
+                'mode': mode,
+                'seconds': best,
+                'mb_per_s': file_size / MB / best if best > 0 else float('inf'),
+            })
+    return results
+
+
+def _run_benchmark(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="Hashing engine micro-benchmark")
+    parser.add_argument("file", nargs='?', help="File to hash (default: a temporary random file)")
+    parser.add_argument("--size", type=int, default=256, help="Size in MB of the temporary file")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode, best time is reported")
+    args = parser.parse_args(argv)
+
+    file_path = args.file
+    temp_path = None
+    if file_path is None:
+        fd, temp_path = tempfile.mkstemp(prefix='hash-bench-')
+        with os.fdopen(fd, 'wb') as f:
+            for _ in range(args.size):
+                f.write(os.urandom(MB))
+        file_path = temp_path
+
+    try:
+        size = os.path.getsize(file_path)
+        print(f"{Fore.CYAN}[+] Benchmarking {file_path} ({size / MB:.1f} MB)")
+        for result in benchmark(file_path, repeat=args.repeat):
+            print(f"{Fore.YELLOW}  - {result['algorithm']:<8} {result['mode']:<12} "
+                  f"{Fore.GREEN}{result['mb_per_s']:9.1f} MB/s")
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+
+
+if __name__ == "__main__":
+    _run_benchmark(sys.argv[1:])
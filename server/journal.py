@@ -0,0 +1,391 @@
+# server/journal.py
+# Write-ahead journal of the renames and deletes a run makes, one file per
+# root under JOURNAL_DIR, as newline-delimited JSON:
+#   {"op": "begin", "root": ..., "version": 1, "ts": ...}
+#   {"op": "move", "seq": 1, "src": "a.pdf", "dest": "Docs/a.pdf"}
+#   {"op": "delete", "seq": 2, "path": "b.pdf", "keep": "a.pdf"}
+#   {"op": "link", "seq": 3, "path": "c.pdf", "keep": "a.pdf", "action": "hardlink" | "reflink"}
+#   {"op": "done" | "failed", "seq": 1, ["error": ...]}
+#   {"op": "end"}          after the run, or "undone" / "undo_end" for --undo
+# Planned operations are fsync'd before any of them is carried out; outcomes
+# are fsync'd in batches. An operation planned without a recorded outcome was
+# in flight (or not yet started) and is settled by looking at its source and
+# destination, so recovery touches only those files, never the whole tree.
+import os
+import json
+import asyncio
+import time
+import shutil
+import contextlib
+import hashlib
+from pathlib import Path
+from .config import JOURNAL_DIR
+from .events import make_reporter
+from .planner import execute_moves_async, MOVE_CHUNK, _copy_chunked, _rename_exclusive
+
+JOURNAL_VERSION = 1
+COMMIT_EVERY = 1024
+COMMIT_INTERVAL = 1.0
+
+
+class JournalError(Exception):
+    pass
+
+
+def journal_path(root):
+    root = os.path.abspath(root)
+    return os.path.join(JOURNAL_DIR, f"{hashlib.sha1(root.encode('utf-8')).hexdigest()[:16]}.journal")
+
+
+class Journal:
+    # Used from one thread (the engine's event loop); not thread-safe
+    def __init__(self, root, path=None):
+        self.root = Path(os.path.abspath(root))
+        self.path = path or journal_path(self.root)
+        self.prefix = os.path.join(str(self.root), '')
+        self.file = None
+        self.seqs = {}
+        self.next_seq = 1
+        self.buffered = 0
+        self.last_commit = time.monotonic()
+        self.written = 0
+        self.synced = 0
+        self.syncing = None
+
+    def begin(self):
+        # Starts a new run for this root. The previous, finished journal is only
+        # replaced once something is planned, so a run with nothing to do keeps
+        # the last real run undoable.
+        previous = read_journal(self.path)
+        if previous is not None and not previous.finished:
+            raise JournalError(f"An interrupted run on {self.root} was found; use --resume or --undo first")
+        return self
+
+    def _open(self):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = open(self.path, 'w', encoding='utf-8')
+            self._write({'op': 'begin', 'root': str(self.root), 'version': JOURNAL_VERSION, 'ts': time.time()})
+
+    @classmethod
+    def reopen(cls, state):
+        journal = cls(state.root, state.path)
+        journal.file = open(state.path, 'a', encoding='utf-8')
+        journal.next_seq = max(state.ops, default=0) + 1
+        return journal
+
+    def _relative(self, path):
+        # Paths from the scan are normally root-prefixed already; relpath is much slower
+        path = str(path)
+        if path.startswith(self.prefix):
+            return path[len(self.prefix):]
+        return os.path.relpath(path, self.root)
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.buffered += 1
+        self.written += 1
+
+    def plan_moves(self, moves, commit=True):
+        # With commit=False the caller must await sync() before carrying the moves out
+        if not moves:
+            return
+        self._open()
+        for src, dest in moves:
+            self._plan(src, {'op': 'move', 'src': self._relative(src), 'dest': self._relative(dest)})
+        if commit:
+            self.commit()
+
+    def plan_deletes(self, groups, action='delete'):
+        # groups: lists of paths whose first entry is kept; the others are
+        # deleted, or replaced by links to it for the other dedup actions
+        groups = [group for group in groups if len(group) > 1]
+        if not groups:
+            return
+        self._open()
+        for group in groups:
+            keep = self._relative(group[0])
+            for dup in group[1:]:
+                record = {'op': 'delete', 'path': self._relative(dup), 'keep': keep}
+                if action != 'delete':
+                    record.update(op='link', action=action)
+                self._plan(dup, record)
+        self.commit()
+
+    def _plan(self, key, record):
+        record['seq'] = self.seqs[str(key)] = self.next_seq
+        self.next_seq += 1
+        self._write(record)
+
+    def done(self, key, error=None):
+        self.record(self.seqs.pop(str(key)), error)
+
+    def record(self, seq, error=None, op=None):
+        if error:
+            self._write({'op': 'failed', 'seq': seq, 'error': str(error)})
+        else:
+            # The common case, written without going through json
+            self.file.write(f'{{"op":"{op or "done"}","seq":{seq}}}\n')
+            self.buffered += 1
+            self.written += 1
+        if self.buffered >= COMMIT_EVERY or time.monotonic() - self.last_commit >= COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.buffered = 0
+        self.last_commit = time.monotonic()
+        self.synced = self.written
+
+    async def sync(self, engine):
+        # Group commit for concurrent tasks: waits until everything written so
+        # far is on disk, sharing one fsync (run off the loop) between callers
+        target = self.written
+        while self.synced < target:
+            if self.syncing is None or self.syncing.done():
+                self.file.flush()
+                self.syncing = asyncio.ensure_future(self._fsync(engine, self.written))
+            await asyncio.shield(self.syncing)
+
+    async def _fsync(self, engine, upto):
+        await engine.call(os.fsync, self.file.fileno())
+        self.synced = max(self.synced, upto)
+        self.buffered = 0
+        self.last_commit = time.monotonic()
+
+    def end(self, op='end'):
+        if self.file is not None:
+            self._write({'op': op})
+        self.close()
+
+    def close(self):
+        if self.file is not None:
+            self.commit()
+            self.file.close()
+            self.file = None
+
+
+class JournalState:
+    def __init__(self, path, root):
+        self.path = path
+        self.root = Path(root)
+        self.ops = {}
+        self.outcomes = {}
+        self.undone = set()
+        self.ended = False
+        self.undo_ended = False
+
+    @property
+    def finished(self):
+        return self.ended or self.undo_ended
+
+    def pending(self):
+        return [op for seq, op in sorted(self.ops.items()) if seq not in self.outcomes]
+
+
+def read_journal(path):
+    # Returns None when there is no journal. A torn final line from a crash is ignored.
+    try:
+        f = open(path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return None
+    state = None
+    with f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            op = record['op']
+            if op == 'begin':
+                state = JournalState(path, record['root'])
+            elif state is None:
+                raise JournalError(f"'{path}' does not start with a begin record")
+            elif op in ('move', 'delete', 'link'):
+                state.ops[record['seq']] = record
+            elif op in ('done', 'failed'):
+                state.outcomes[record['seq']] = op
+            elif op == 'undone':
+                state.undone.add(record['seq'])
+            elif op == 'end':
+                state.ended = True
+            elif op == 'undo_end':
+                state.undo_ended = True
+    return state
+
+
+def _settle(job):
+    # Works out whether an operation without a recorded outcome happened.
+    # Returns 'done', 'todo' or an exception for an inconsistent state.
+    root, op = job
+    if op['op'] == 'delete':
+        return 'todo' if os.path.lexists(root / op['path']) else 'done'
+    if op['op'] == 'link':
+        # The rename leaves path in place either way. A hard link shows in the
+        # inode; a reflink cannot be told from a copy, so it is made again.
+        path = root / op['path']
+        if not os.path.lexists(path):
+            return JournalError(f"{op['path']} is missing")
+        keep = root / op['keep']
+        if op['action'] == 'hardlink' and os.path.exists(keep) and os.path.samefile(path, keep):
+            return 'done'
+        return 'todo'
+    src, dest = os.path.lexists(root / op['src']), os.path.lexists(root / op['dest'])
+    if dest and not src:
+        return 'done'
+    if src and not dest:
+        return 'todo'
+    return JournalError(f"both {op['src']} and {op['dest']} exist" if src else f"{op['src']} is missing")
+
+
+def _delete(job):
+    root, op = job
+    try:
+        if not os.path.isfile(root / op['keep']):
+            raise FileNotFoundError(f"the copy being kept, '{op['keep']}', is gone")
+        if op['op'] == 'link':
+            from .duplicate_remover import link_duplicate
+            link_duplicate(root / op['keep'], root / op['path'], op['action'])
+        else:
+            os.remove(root / op['path'])
+        return None
+    except OSError as e:
+        return e
+
+
+async def _settle_pending(engine, state, journal, result, events):
+    todo = []
+    async for (_, op), outcome in engine.map_unordered(_settle, [(state.root, op) for op in state.pending()],
+                                                       chunk_size=MOVE_CHUNK):
+        if outcome == 'todo':
+            todo.append(op)
+        elif outcome == 'done':
+            result['already_done'] += 1
+            journal.record(op['seq'])
+            state.outcomes[op['seq']] = 'done'
+        else:
+            result['failed'] += 1
+            journal.record(op['seq'], outcome)
+            events.emit('journal.error', file=op.get('src', op.get('path')), error=str(outcome))
+    return sorted(todo, key=lambda op: op['seq'])
+
+
+async def resume(engine, root, events=None):
+    # Finishes the operations an interrupted run had planned. Returns None if
+    # there is nothing to resume.
+    events = events or make_reporter('none')
+    state = read_journal(journal_path(root))
+    if state is None or state.finished:
+        events.emit('journal.nothing', path=os.path.abspath(root), action='resume')
+        return None
+    journal = Journal.reopen(state)
+    result = {'already_done': 0, 'completed': 0, 'failed': 0}
+    try:
+        todo = await _settle_pending(engine, state, journal, result, events)
+        events.emit('journal.resume', path=str(state.root), planned=len(state.ops), todo=len(todo),
+                    already_done=result['already_done'])
+
+        # Deletes and links were planned and run before the moves, so they go first again
+        deletes = [(state.root, op) for op in todo if op['op'] != 'move']
+        async for (_, op), error in engine.map_unordered(_delete, deletes, chunk_size=MOVE_CHUNK):
+            result['failed' if error else 'completed'] += 1
+            journal.record(op['seq'], error)
+            if error:
+                events.emit('journal.error', file=op['path'], error=str(error))
+
+        seqs = {}
+        moves = []
+        for op in todo:
+            if op['op'] == 'move':
+                src = state.root / op['src']
+                seqs[src] = op['seq']
+                moves.append((src, state.root / op['dest']))
+        done = 0
+        events.emit('progress', stage='move', path=str(state.root), done=0, total=len(moves))
+        async for src, dest, error in execute_moves_async(engine, moves):
+            done += 1
+            result['failed' if error else 'completed'] += 1
+            journal.record(seqs[src], error)
+            if error:
+                events.emit('journal.error', file=str(src), error=str(error))
+            events.emit('progress', stage='move', path=str(state.root), done=done, total=len(moves))
+        journal.end()
+    finally:
+        journal.close()
+    events.emit('journal.resumed', path=str(state.root), **result)
+    return result
+
+
+def _undo(job):
+    root, op = job
+    try:
+        if op['op'] == 'move':
+            _rename_exclusive(root / op['dest'], root / op['src'])
+        else:
+            # The deleted file was an exact copy of the one kept, so it is restored from it
+            path, keep = root / op['path'], root / op['keep']
+            if op['op'] == 'link':
+                # The link is swapped for a copy of its own, through a rename so path never goes missing
+                tmp = path.with_name(f".{path.name}.{os.getpid()}.undo")
+                try:
+                    _copy_chunked(keep, tmp)
+                    shutil.copystat(keep, tmp)
+                    os.replace(tmp, path)
+                except BaseException:
+                    with contextlib.suppress(OSError):
+                        os.remove(tmp)
+                    raise
+            else:
+                _copy_chunked(keep, path)
+                shutil.copystat(keep, path)
+        return None
+    except OSError as e:
+        return e
+
+
+def _remove_empty_folders(folders):
+    for folder in folders:
+        try:
+            os.rmdir(folder)
+        except OSError:
+            pass
+
+
+async def undo(engine, root, events=None):
+    # Reverts the journal's completed operations, newest first. Returns None if
+    # there is nothing to undo.
+    events = events or make_reporter('none')
+    state = read_journal(journal_path(root))
+    if state is None or state.undo_ended:
+        events.emit('journal.nothing', path=os.path.abspath(root), action='undo')
+        return None
+    journal = Journal.reopen(state)
+    result = {'restored': 0, 'failed': 0, 'already_done': 0}
+    try:
+        # In-flight operations of an interrupted run count if they happened
+        await _settle_pending(engine, state, journal, result, events)
+        ops = [op for seq, op in sorted(state.ops.items(), reverse=True)
+               if state.outcomes.get(seq) == 'done' and seq not in state.undone]
+        events.emit('journal.undo', path=str(state.root), operations=len(ops))
+
+        # Moves first: a delete's kept copy may itself have been moved afterwards
+        folders = set()
+        for kind in ('move', 'delete'):
+            batch = [(state.root, op) for op in ops if (op['op'] == 'move') == (kind == 'move')]
+            async for (_, op), error in engine.map_unordered(_undo, batch, chunk_size=MOVE_CHUNK):
+                if error:
+                    result['failed'] += 1
+                    events.emit('journal.error', file=op.get('dest', op.get('path')), error=str(error))
+                    continue
+                result['restored'] += 1
+                journal.record(op['seq'], op='undone')
+                if kind == 'move':
+                    folders.add(state.root / os.path.dirname(op['dest']))
+        await engine.call(_remove_empty_folders, folders)
+        if not result['failed']:
+            journal.end('undo_end')
+    finally:
+        journal.close()
+    events.emit('journal.undone', path=str(state.root), restored=result['restored'], failed=result['failed'])
+    return result
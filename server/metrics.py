@@ -0,0 +1,186 @@
+# server/metrics.py
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+PREFIX = 'organizer_'
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+
+class Counter:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Histogram:
+    # Prometheus-style buckets; quantiles are estimated as the upper bound of
+    # the bucket they fall in
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            self.max = max(self.max, value)
+
+    def quantile(self, q):
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class _Noop:
+    # Handed out while metrics are disabled, so instrumented code pays one method call
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+NOOP = _Noop()
+
+
+def _series(name, labels):
+    if not labels:
+        return PREFIX + name
+    return PREFIX + name + '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class Metrics:
+    # Process-wide registry. Disabled by default: counter() and histogram()
+    # then return NOOP without touching the registry.
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def counter(self, name, **labels):
+        if not self.enabled:
+            return NOOP
+        key = (name, tuple(sorted(labels.items())))
+        counter = self.counters.get(key)
+        if counter is None:
+            with self.lock:
+                counter = self.counters.setdefault(key, Counter())
+        return counter
+
+    def histogram(self, name, buckets=LATENCY_BUCKETS, **labels):
+        if not self.enabled:
+            return NOOP
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram(buckets))
+        return histogram
+
+    def value(self, name, **labels):
+        counter = self.counters.get((name, tuple(sorted(labels.items()))))
+        return counter.value if counter is not None else 0
+
+    def _items(self):
+        # Copies taken under the lock, since worker threads may register new series
+        with self.lock:
+            return sorted(self.counters.items()), sorted(self.histograms.items())
+
+    def snapshot(self):
+        # JSON-friendly view used by the run.metrics event and the daemon's stats
+        counter_items, histogram_items = self._items()
+        phases = {}
+        for (name, labels), counter in counter_items:
+            if name in ('phase_files_total', 'phase_seconds_total'):
+                phase = phases.setdefault(dict(labels)['phase'], {'files': 0, 'seconds': 0.0})
+                phase['files' if name == 'phase_files_total' else 'seconds'] = counter.value
+        for phase in phases.values():
+            phase['files_per_second'] = phase['files'] / phase['seconds'] if phase['seconds'] else None
+        counters = {_series(name, labels): counter.value for (name, labels), counter in counter_items
+                    if name not in ('phase_files_total', 'phase_seconds_total')}
+        histograms = {_series(name, labels): {'count': h.count, 'sum': h.sum, 'p50': h.quantile(0.5),
+                                              'p95': h.quantile(0.95), 'max': h.max}
+                      for (name, labels), h in histogram_items if h.count}
+        return {'phases': phases, 'counters': counters, 'histograms': histograms}
+
+    def prometheus(self):
+        counter_items, histogram_items = self._items()
+        lines = []
+        typed = set()
+        for (name, labels), counter in counter_items:
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                typed.add(name)
+            lines.append(f"{_series(name, labels)} {counter.value}")
+        for (name, labels), histogram in histogram_items:
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f"{_series(name + '_bucket', labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{_series(name + '_sum', labels)} {histogram.sum}")
+            lines.append(f"{_series(name + '_count', labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
+
+
+METRICS = Metrics()
+
+
+def inc(name, amount=1, **labels):
+    if METRICS.enabled:
+        METRICS.counter(name, **labels).inc(amount)
+
+
+def observe(name, value, **labels):
+    if METRICS.enabled:
+        METRICS.histogram(name, **labels).observe(value)
+
+
+@contextmanager
+def phase(name):
+    # Wall time of one pipeline phase; files are counted with phase_files(name, n)
+    if not METRICS.enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICS.counter('phase_seconds_total', phase=name).inc(time.perf_counter() - start)
+
+
+def phase_files(phase_name, amount=1):
+    if METRICS.enabled:
+        METRICS.counter('phase_files_total', phase=phase_name).inc(amount)
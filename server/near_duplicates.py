@@ -0,0 +1,228 @@
+# server/near_duplicates.py
+# Near-duplicate images: resized, recompressed or re-saved copies of the same
+# picture, which exact hashing cannot match. Each image gets a 64-bit
+# perceptual hash computed from a small grayscale thumbnail, and images whose
+# hashes differ in at most max_distance bits are grouped. Neighbours are
+# found with multi-index hashing, so each image is only compared with the few
+# hashes that can be close to it rather than with every other image.
+# Groups are only reported: the files are not identical, so nothing is
+# removed automatically. Needs Pillow and NumPy, which are optional.
+import os
+from functools import partial
+from itertools import combinations
+from pathlib import Path
+from .duplicate_remover import build_index, hash_files, as_roots
+from .events import make_reporter
+from .hash_cache import HashCache
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+    Image = None
+
+HASH_SIZE = 8
+CHUNKS = 4
+CHUNK_BITS = HASH_SIZE * HASH_SIZE // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+DCT_SIZE = 32
+IMAGE_HASHES = ['dhash', 'phash']
+DEFAULT_MAX_DISTANCE = 10
+# Largest max_distance the index serves: each chunk is then searched within
+# max_distance // CHUNKS = 3 bits, 697 probes per 16-bit chunk. At 4 bits it
+# would be 2,517 probes, and at 32 bits (8 per chunk) about 39,000, more work
+# than comparing every pair.
+MAX_DISTANCE = CHUNKS * 4 - 1
+# Raster formats Pillow decodes out of the box
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tif', '.tiff'}
+
+_dct_matrix = None
+
+
+def available():
+    return Image is not None and np is not None
+
+
+def _thumbnail(image, width, height):
+    # JPEGs can be decoded at a fraction of their size, which is most of the cost for photos
+    image.draft('L', (width * 4, height * 4))
+    return np.asarray(image.convert('L').resize((width, height), Image.LANCZOS), dtype=np.float32)
+
+
+def _dhash(image):
+    # Whether each pixel is brighter than its right-hand neighbour
+    pixels = _thumbnail(image, HASH_SIZE + 1, HASH_SIZE)
+    return pixels[:, 1:] > pixels[:, :-1]
+
+
+def _phash(image):
+    # Low frequencies of the thumbnail's 2-D DCT, against their median (the DC term left out)
+    global _dct_matrix
+    if _dct_matrix is None:
+        n = np.arange(DCT_SIZE)
+        _dct_matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * DCT_SIZE))
+    pixels = _thumbnail(image, DCT_SIZE, DCT_SIZE)
+    low = (_dct_matrix @ pixels @ _dct_matrix.T)[:HASH_SIZE, :HASH_SIZE]
+    return low > np.median(low.flatten()[1:])
+
+
+def image_hash(file_path, algorithm='dhash'):
+    # Returns "<16 hex digits>:<width>x<height>", the form HashCache stores;
+    # the size decides which copy is kept. Raises OSError for files that
+    # cannot be read or decoded, like digest_file.
+    func = {'dhash': _dhash, 'phash': _phash}[algorithm]
+    try:
+        with Image.open(file_path) as image:
+            width, height = image.size
+            bits = func(image)
+    except OSError:
+        raise
+    except Exception as e:
+        # Pillow reports some corrupt or oversized images with other exceptions
+        raise OSError(f"cannot decode image: {e}") from e
+    return f"{np.packbits(bits.flatten()).tobytes().hex()}:{width}x{height}"
+
+
+def _parse(digest):
+    # -> (hash as an int, pixel count)
+    value, _, size = digest.partition(':')
+    width, _, height = size.partition('x')
+    return int(value, 16), int(width) * int(height)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _near_pairs(values, max_distance):
+    # Multi-index hashing over an array of distinct 64-bit hashes. Each hash
+    # is split into CHUNKS chunks; two hashes at most max_distance bits apart
+    # are, by the pigeonhole principle, at most max_distance // CHUNKS bits
+    # apart in one of the chunks. So for every chunk and every way of flipping
+    # that many of its bits, the hashes whose chunk equals the flipped value
+    # are looked up in a table of all 2**CHUNK_BITS chunk values and checked
+    # in full. (A BK-tree prunes almost nothing at these distances: unrelated
+    # 64-bit hashes sit about 32 bits apart, so most of the tree is visited.)
+    # Returns index arrays (i, j), i < j, of the pairs within max_distance.
+    radius = max_distance // CHUNKS
+    flips = [sum(1 << bit for bit in bits) for count in range(radius + 1)
+             for bits in combinations(range(CHUNK_BITS), count)]
+    popcount = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+    positions = np.arange(len(values))
+    found_i, found_j = [], []
+    for chunk in range(CHUNKS):
+        keys = ((values >> np.uint64(chunk * CHUNK_BITS)) & np.uint64(CHUNK_MASK)).astype(np.intp)
+        # Hashes sorted by this chunk, with where each chunk value's run starts and how long it is
+        order = np.argsort(keys, kind='stable')
+        bucket_counts = np.bincount(keys, minlength=CHUNK_MASK + 1)
+        bucket_starts = np.cumsum(bucket_counts) - bucket_counts
+        for flip in flips:
+            wanted = keys ^ flip
+            starts = bucket_starts[wanted]
+            counts = bucket_counts[wanted]
+            total = int(counts.sum())
+            if not total:
+                continue
+            i = np.repeat(positions, counts)
+            j = order[np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)]
+            i, j = i[i < j], j[i < j]
+            distances = popcount[(values[i] ^ values[j]).view(np.uint8)].reshape(-1, 8).sum(axis=1)
+            near = distances <= max_distance
+            found_i.append(i[near])
+            found_j.append(j[near])
+    if not found_i:
+        return np.array([], dtype=np.intp), np.array([], dtype=np.intp)
+    return np.concatenate(found_i), np.concatenate(found_j)
+
+
+def _cluster(digests, max_distance):
+    # Groups file ids whose hashes are linked by chains of near neighbours.
+    # Returns lists of two or more ids.
+    by_value = {}
+    for file_id, digest in digests.items():
+        by_value.setdefault(_parse(digest)[0], []).append(file_id)
+    values = list(by_value)
+    parents = list(range(len(values)))
+
+    def find(position):
+        while parents[position] != position:
+            parents[position] = parents[parents[position]]
+            position = parents[position]
+        return position
+
+    for i, j in zip(*_near_pairs(np.array(values, dtype=np.uint64), max_distance)):
+        parents[find(int(j))] = find(int(i))
+
+    clusters = {}
+    for position, value in enumerate(values):
+        clusters.setdefault(find(position), []).extend(by_value[value])
+    return [file_ids for file_ids in clusters.values() if len(file_ids) > 1]
+
+
+async def find_near_duplicate_groups(engine, roots, cache=None, algorithm='dhash', max_distance=DEFAULT_MAX_DISTANCE,
+                                     backend='thread', events=None, recursive=False):
+    # Returns lists of (Path, size, distance from the first), the copy to
+    # keep first: the most pixels, then the largest file, as the least
+    # resized or compressed
+    events = events or make_reporter('none')
+    if not available():
+        raise RuntimeError("Near-duplicate detection needs Pillow and NumPy (pip install Pillow numpy)")
+    if algorithm not in IMAGE_HASHES:
+        raise ValueError(f"Unknown image hash '{algorithm}'. Use: {', '.join(IMAGE_HASHES)}")
+    if not 0 <= max_distance <= MAX_DISTANCE:
+        raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE}")
+
+    index, _, errors = await engine.call(build_index, roots, recursive)
+    for file, error in errors:
+        events.emit('dedup.error', op='stat', file=file, error=str(error))
+    ids = [file_id for file_id, file_path in enumerate(index.paths)
+           if os.path.splitext(file_path)[1].lower() in IMAGE_EXTENSIONS]
+    if not ids:
+        events.emit('dedup.empty')
+        return []
+
+    digests = await hash_files(engine, index, ids, partial(image_hash, algorithm=algorithm),
+                                f"{algorithm}-{HASH_SIZE}", cache, 'image_hash', backend, events)
+    clusters = await engine.call(_cluster, digests, max_distance)
+    events.emit('dedup.stage', stage='image_hash', before=len(ids), after=sum(map(len, clusters)))
+
+    parsed = {file_id: _parse(digests[file_id]) for cluster in clusters for file_id in cluster}
+    groups = []
+    for cluster in clusters:
+        cluster.sort(key=lambda file_id: (-parsed[file_id][1], -index.sizes[file_id], index.paths[file_id]))
+        kept = parsed[cluster[0]][0]
+        groups.append([(Path(index.paths[file_id]), index.sizes[file_id], hamming(kept, parsed[file_id][0]))
+                       for file_id in cluster])
+    groups.sort(key=lambda group: group[0][0])
+    return groups
+
+
+async def find_near_duplicates(engine, path, use_cache=True, algorithm='dhash', max_distance=DEFAULT_MAX_DISTANCE,
+                               backend='thread', cache=None, events=None, recursive=False):
+    # Reports near-duplicate images under path (one root or a list of roots).
+    # Perceptual hashes are cached in the hash cache next to the exact ones.
+    own_events = events is None
+    events = events or make_reporter()
+    try:
+        events.emit('dedup.start', path=', '.join(str(root) for root in as_roots(path)))
+        find = partial(find_near_duplicate_groups, engine, as_roots(path), algorithm=algorithm,
+                       max_distance=max_distance, backend=backend, events=events, recursive=recursive)
+        if cache is not None or not use_cache:
+            groups = await find(cache=cache)
+            if cache is not None:
+                await engine.call(cache.flush)
+        else:
+            with HashCache() as cache:
+                groups = await find(cache=cache)
+
+        for group in groups:
+            events.emit('dedup.similar', keep=str(group[0][0]),
+                        files=[{'file': str(file), 'size': size, 'distance': distance}
+                               for file, size, distance in group[1:]])
+        events.emit('dedup.similar_done', groups=len(groups), files=sum(len(group) - 1 for group in groups),
+                    space=sum(size for group in groups for _, size, _ in group[1:]))
+        return groups
+    finally:
+        if own_events:
+            events.close()
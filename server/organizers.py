@@ -1,164 +1,236 @@
-import shutil
+import os
+import re
+import asyncio
 from pathlib import Path
+from contextlib import nullcontext
 from datetime import datetime
-from tqdm import tqdm
-from colorama import Fore
-from .utils import get_category, format_file_size, CATEGORY_MAP
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import os
-
-def organize_by_type(path):
-    files = [f for f in Path(path).iterdir() if f.is_file()]
-    if not files:
-        print(f"{Fore.YELLOW}[!] No files found in {path}")
-        return
-
-    print(f"{Fore.CYAN}[+] Organizing {len(files)} files by type in parallel...")
-
-    category_counts = {category: 0 for category in CATEGORY_MAP.keys()}
-
-    def move_file(file):
-        try:
-            category = get_category(file)
-            dest_folder = Path(path) / category
-            dest_folder.mkdir(exist_ok=True)
-            dest_file = dest_folder / file.name
-
-            counter = 1
-            while dest_file.exists():
-                dest_file = dest_folder / f"{file.stem}_{counter}{file.suffix}"
-                counter += 1
-            
-            shutil.move(str(file), str(dest_file))
-            return category, None
-        except Exception as e:
-            return None, f"\n{Fore.RED}[ERROR] Error moving {file}: {e}"
-
-    with ThreadPoolExecutor(max_workers=os.cpu_count() * 2) as executor:
-        future_to_file = {executor.submit(move_file, file): file for file in files}
-        for future in tqdm(as_completed(future_to_file), total=len(files),
-                        desc=f"{Fore.WHITE}Moving files",
-                        bar_format=f"{Fore.BLUE}{{l_bar}}{Fore.CYAN}{{bar}} {Fore.GREEN}{{n_fmt}}/{Fore.GREEN}{{total_fmt}} [{Fore.YELLOW}{{elapsed}}<{Fore.YELLOW}{{remaining}}] {Fore.MAGENTA}{{percentage:3.0f}}%"):
-            category, error = future.result()
-            if category:
-                category_counts[category] += 1
-            if error:
-                print(error)
-
-    print(f"\n{Fore.GREEN}[✓] Files organized by type")
-    print(f"{Fore.CYAN}[SUMMARY] Files organized by category:")
-    for category, count in category_counts.items():
-        if count > 0:
-            print(f"{Fore.YELLOW}  - {category}: {count} files")
-
-            
-def organize_by_date(path):
-    files = [f for f in Path(path).iterdir() if f.is_file()]
-
-    if not files:
-        print(f"{Fore.YELLOW}[!] No files found in {path}")
-        return
-
-    print(f"{Fore.CYAN}[+] Organizing {len(files)} files by creation date...")
-
-    month_counts = {}
-
-    progress_bar = tqdm(
-        files, 
-        bar_format=f"{Fore.BLUE}{{l_bar}}{Fore.CYAN}{{bar}} {Fore.GREEN}{{n_fmt}}/{Fore.GREEN}{{total_fmt}} [{Fore.YELLOW}{{elapsed}}<{Fore.YELLOW}{{remaining}}] {Fore.MAGENTA}{{percentage:3.0f}}%"
-    )
-
-    for file in progress_bar:
+from .categories import get_category_index, OTHERS_CATEGORY
+from .engine import run
+from .events import make_reporter
+from .metrics import inc, phase, phase_files
+from .scanner import scan_entries
+from .planner import plan_moves, execute_moves, execute_moves_async
+from .state import select_entries
+
+SIZE_CATEGORIES = {
+    'Tiny (< 100KB) 🔍': 100 * 1024,
+    'Small (100KB - 1MB) 📎': 1 * 1024 * 1024,
+    'Medium (1MB - 100MB) 📘': 100 * 1024 * 1024,
+    'Large (100MB - 1GB) 📦': 1 * 1024 * 1024 * 1024,
+    'Huge (> 1GB) 🗄️': float('inf')
+}
+
+
+# Folders the organizer creates: categories, size classes and months
+DATE_FOLDER = re.compile(r'\d{4}-\d{2} \(.+\)$')
+
+
+def output_folder_names():
+    # Category and size folder names; month folders are matched with DATE_FOLDER
+    return set(get_category_index().categories) | set(SIZE_CATEGORIES)
+
+
+def is_output_folder(name, names=None):
+    return name in (names if names is not None else output_folder_names()) or DATE_FOLDER.match(name) is not None
+
+
+def type_folder(entry):
+    return get_category_index().classify(entry.name)
+
+
+async def content_type_folders(engine, files, classify='auto', events=None):
+    # 'content' sniffs every file; 'auto' only those the extension cannot place.
+    # Header reads run concurrently; returns a folder function for _organize.
+    from .sniffer import get_sniffer  # loads the signature table from config.json
+
+    index = get_category_index()
+    if classify == 'content':
+        candidates = files
+    else:
+        candidates = [entry for entry in files if index.classify(entry.name) == OTHERS_CATEGORY]
+    sniffer = get_sniffer()
+    sniffed = {}
+    with phase('sniff'):
+        async for entry, ext in engine.map_unordered(sniffer.sniff, candidates):
+            if ext:
+                sniffed[entry.path] = ext
+    phase_files('sniff', len(candidates))
+    if sniffed and events is not None:
+        events.emit('organize.classified', sniffed=len(sniffed), candidates=len(candidates))
+
+    def folder_for(entry):
+        ext = sniffed.get(entry.path)
+        # A container family only places files that have no extension to go by
+        if ext is None or (ext in sniffer.containers and os.path.splitext(entry.name.lstrip('.'))[1]):
+            return index.classify(entry.name)
+        return index.classify_suffix(ext)
+    return folder_for
+
+
+def date_folder(entry):
+    created_time = datetime.fromtimestamp(entry.stat().st_ctime)
+    return created_time.strftime('%Y-%m (%B)')
+
+
+def size_folder(entry):
+    size = entry.stat().st_size
+    for category, threshold in SIZE_CATEGORIES.items():
+        if size < threshold:
+            return category
+
+
+FOLDER_FUNCS = {'type': type_folder, 'date': date_folder, 'size': size_folder}
+
+
+def organize_file(path, file, mode, indexes=None, lock=None):
+    # Classify and move a single file without a progress bar. Pass the same
+    # indexes dict across calls to avoid re-listing destination folders, and a
+    # lock when those calls come from several threads.
+    file = Path(file)
+    folder_name = FOLDER_FUNCS[mode](file)
+    with lock or nullcontext():
+        moves = plan_moves(path, [(file, folder_name)], {} if indexes is None else indexes)
+    for _, dest, error in execute_moves(moves):
+        if error:
+            raise error
+        return dest
+
+
+def _select_files(path, state=None, since=None):
+    with phase('scan'):
+        files, skipped = select_entries(scan_entries(path), state, since)
+    phase_files('scan', len(files) + skipped)
+    return files, skipped
+
+
+def _assign(files, folder_for):
+    assignments = []
+    stats = {}
+    errors = []
+    for entry in files:
+        file = Path(entry.path)
         try:
-            created_time = datetime.fromtimestamp(file.stat().st_ctime)
-            folder_name = created_time.strftime('%Y-%m (%B)')
-            progress_bar.set_description(f"{Fore.WHITE}Moving {file.name[:15]} to {folder_name}")
-            
-            dest_folder = Path(path) / folder_name
-            dest_folder.mkdir(exist_ok=True)
-            dest_file = dest_folder / file.name
-            
-
-            counter = 1
-            while dest_file.exists():
-                dest_file = dest_folder / f"{file.stem}_{counter}{file.suffix}"
-                counter += 1
-                
-            shutil.move(str(file), str(dest_file))
-            
-
-            if folder_name not in month_counts:
-                month_counts[folder_name] = 0
-            month_counts[folder_name] += 1
-                
+            assignments.append((file, folder_for(entry)))
+            inc('syscalls_total', op='stat')
+            stats[file] = entry.stat()
         except Exception as e:
-            print(f"\n{Fore.RED}[ERROR] Error moving {file}: {e}")
-
-
-    print(f"\n{Fore.GREEN}[✓] Files organized by date")
-    print(f"{Fore.CYAN}[SUMMARY] Files organized by month:")
-    for month, count in sorted(month_counts.items()):
-        print(f"{Fore.YELLOW}  - {month}: {count} files")
-
-def organize_by_size(path):
-
-    files = [f for f in Path(path).iterdir() if f.is_file()]
-
+            errors.append((file, e))
+    return assignments, stats, errors
+
+
+async def _plan(engine, path, files, folder_for, events):
+    # Returns the (src, dest) moves and each source's stat result
+    assignments, stats, errors = await engine.call(_assign, files, folder_for)
+    for file, error in errors:
+        events.emit('organize.error', file=str(file), error=str(error))
+    return await engine.call(plan_moves, path, assignments), stats
+
+
+async def _folder_func(engine, mode, files, classify, events):
+    if mode == 'type' and classify != 'extension':
+        return await content_type_folders(engine, files, classify, events)
+    return FOLDER_FUNCS[mode]
+
+
+async def _organize(engine, path, files, folder_for, state=None, events=None, journal=None):
+    moves, stats = await _plan(engine, path, files, folder_for, events)
+    if journal is not None:
+        journal.plan_moves(moves)
+    folder_counts = {}
+    move_stats = {}
+    done = 0
+    events.emit('progress', stage='move', path=str(path), done=0, total=len(moves))
+    try:
+        with phase('move'):
+            async for src, dest, error in execute_moves_async(engine, moves, move_stats):
+                done += 1
+                if journal is not None:
+                    journal.done(src, error)
+                if error:
+                    events.emit('organize.error', file=str(src), error=str(error))
+                else:
+                    folder_counts[dest.parent.name] = folder_counts.get(dest.parent.name, 0) + 1
+                if state is not None:
+                    state.record(src.name, stats[src], None if error else dest, failed=bool(error))
+                events.emit('progress', stage='move', path=str(path), done=done, total=len(moves))
+    except asyncio.CancelledError:
+        events.emit('organize.cancelled', path=str(path), done=done, total=len(moves))
+        raise
+    finally:
+        phase_files('move', done)
+
+    if move_stats['copied']:
+        events.emit('organize.copied', path=str(path), copied=move_stats['copied'],
+                    bytes_copied=move_stats['bytes_copied'], seconds=move_stats['copy_seconds'])
+    return folder_counts
+
+
+def _ordered_counts(mode, counts):
+    # Summary order: settings order for categories, size order for sizes, months sorted
+    if mode == 'type':
+        ordered = {category: 0 for category in get_category_index().categories}
+    elif mode == 'size':
+        ordered = {category: 0 for category in SIZE_CATEGORIES}
+    else:
+        ordered = {}
+    for folder, count in sorted(counts.items()) if mode == 'date' else counts.items():
+        ordered[folder] = ordered.get(folder, 0) + count
+    return {folder: count for folder, count in ordered.items() if count > 0}
+
+
+async def organize(engine, path, mode='type', state=None, since=None, classify='extension', events=None,
+                   journal=None):
+    # Progress and results are reported through events (see events.py); the
+    # default reporter prints to the terminal. With a Journal (see journal.py)
+    # the moves are recorded so an interrupted run can be resumed or undone.
+    own_events = events is None
+    events = events or make_reporter()
+    try:
+        files, skipped = await engine.call(_select_files, path, state, since)
+        if skipped:
+            events.emit('organize.skipped', path=str(path), skipped=skipped)
+        if not files:
+            events.emit('organize.empty', path=str(path))
+            return {}
+
+        events.emit('organize.start', path=str(path), mode=mode, files=len(files))
+
+        folder_for = await _folder_func(engine, mode, files, classify, events)
+        counts = _ordered_counts(mode, await _organize(engine, path, files, folder_for, state, events,
+                                                        journal))
+        events.emit('organize.done', path=str(path), mode=mode, files_organized=sum(counts.values()), folders=counts)
+        return counts
+    finally:
+        if own_events:
+            events.close()
+
+
+async def plan_organize(engine, path, mode='type', state=None, since=None, classify='extension',
+                        exclude=(), events=None):
+    # The moves organize() would make, as (src, dest, stat result), without
+    # touching the disk. Files in exclude (paths as str) are left out, e.g.
+    # duplicates a dry run has already planned to delete.
+    events = events or make_reporter('none')
+    files, skipped = await engine.call(_select_files, path, state, since)
+    if exclude:
+        exclude = set(exclude)
+        files = [entry for entry in files if entry.path not in exclude]
+    if skipped:
+        events.emit('organize.skipped', path=str(path), skipped=skipped)
     if not files:
-        print(f"{Fore.YELLOW}[!] No files found in {path}")
-        return
+        return []
+    folder_for = await _folder_func(engine, mode, files, classify, events)
+    moves, stats = await _plan(engine, path, files, folder_for, events)
+    return [(src, dest, stats[src]) for src, dest in moves]
 
-    print(f"{Fore.CYAN}[+] Organizing {len(files)} files by size...")
 
+def organize_by_type(path, state=None, since=None, classify='extension'):
+    return run(lambda engine: organize(engine, path, 'type', state, since, classify))
 
-    size_categories = {
-        'Tiny (< 100KB) 🔍': 100 * 1024,
-        'Small (100KB - 1MB) 📎': 1 * 1024 * 1024,
-        'Medium (1MB - 100MB) 📘': 100 * 1024 * 1024,
-        'Large (100MB - 1GB) 📦': 1 * 1024 * 1024 * 1024,
-        'Huge (> 1GB) 🗄️': float('inf')
-    }
 
-
-    category_counts = {category: 0 for category in size_categories.keys()}
-
-
-    progress_bar = tqdm(
-        files, 
-        bar_format=f"{Fore.BLUE}{{l_bar}}{Fore.CYAN}{{bar}} {Fore.GREEN}{{n_fmt}}/{Fore.GREEN}{{total_fmt}} [{Fore.YELLOW}{{elapsed}}<{Fore.YELLOW}{{remaining}}] {Fore.MAGENTA}{{percentage:3.0f}}%"
-    )
-
-    for file in progress_bar:
-        try:
-            size = file.stat().st_size
-            size_category = None
-            
-            for category, threshold in size_categories.items():
-                if size < threshold:
-                    size_category = category
-                    break
-            
-            progress_bar.set_description(f"{Fore.WHITE}Moving {file.name[:15]} ({format_file_size(size)}) to {size_category}")
-            
-            dest_folder = Path(path) / size_category
-            dest_folder.mkdir(exist_ok=True)
-            dest_file = dest_folder / file.name
-            
-
-            counter = 1
-            while dest_file.exists():
-                dest_file = dest_folder / f"{file.stem}_{counter}{file.suffix}"
-                counter += 1
-                
-            shutil.move(str(file), str(dest_file))
-            category_counts[size_category] += 1
-                
-        except Exception as e:
-            print(f"\n{Fore.RED}[ERROR] Error moving {file}: {e}")
+def organize_by_date(path, state=None, since=None):
+    return run(lambda engine: organize(engine, path, 'date', state, since))
 
 
-    print(f"\n{Fore.GREEN}[✓] Files organized by size")
-    print(f"{Fore.CYAN}[SUMMARY] Files organized by size category:")
-    for category, count in category_counts.items():
-        if count > 0:
-            print(f"{Fore.YELLOW}  - {category}: {count} files")
\ No newline at end of file
+def organize_by_size(path, state=None, since=None):
+    return run(lambda engine: organize(engine, path, 'size', state, since))
@@ -0,0 +1,197 @@
+# server/plan.py
+# Dry runs. build_plan() works out every delete and move a run would make,
+# from directory listings and stat results only (dedup still has to hash the
+# candidates), and the plan is saved as JSON. apply_plan() carries a saved plan
+# out without rescanning or classifying again; each file is checked against
+# the size and mtime recorded in the plan so changed files are skipped.
+import os
+import json
+import time
+from functools import partial
+from pathlib import Path
+from .duplicate_remover import find_duplicates, link_duplicate
+from .events import make_reporter
+from .organizers import plan_organize
+from .planner import execute_moves_async, MOVE_CHUNK
+
+PLAN_VERSION = 1
+
+
+def _relative(root, path):
+    return os.path.relpath(path, root)
+
+
+def _stat_deletes(root, groups):
+    # Also returns the mtime of the copy kept for each duplicate, which a hard link takes on
+    deletes = []
+    keep_mtimes = {}
+    errors = []
+    for group in groups:
+        try:
+            keep_mtime = os.stat(group[0]).st_mtime_ns
+        except OSError as e:
+            errors.append((group[0], e))
+            continue
+        for dup in group[1:]:
+            try:
+                st = os.stat(dup)
+            except OSError as e:
+                errors.append((dup, e))
+                continue
+            deletes.append({'path': _relative(root, dup), 'keep': _relative(root, group[0]),
+                            'size': st.st_size, 'mtime_ns': st.st_mtime_ns})
+            keep_mtimes[deletes[-1]['path']] = keep_mtime
+    return deletes, keep_mtimes, errors
+
+
+def _totals(moves, deletes):
+    destinations = {}
+    for move in moves:
+        folder = os.path.dirname(move['dest'])
+        totals = destinations.setdefault(folder, {'files': 0, 'bytes': 0})
+        totals['files'] += 1
+        totals['bytes'] += move['size']
+    return {'moves': len(moves), 'move_bytes': sum(move['size'] for move in moves),
+            'deletes': len(deletes), 'delete_bytes': sum(delete['size'] for delete in deletes),
+            'destinations': destinations}
+
+
+async def build_plan(engine, path, mode='type', state=None, since=None, classify='extension',
+                     remove_duplicates=False, use_cache=True, algorithm='sha256', backend='thread', events=None,
+                     keep='oldest', dedup_action='delete', verify=False):
+    events = events or make_reporter('none')
+    root = os.path.abspath(path)
+    deletes = []
+    keep_mtimes = {}
+    if remove_duplicates:
+        events.emit('dedup.start', path=root)
+        groups = await find_duplicates(engine, root, use_cache, algorithm, backend, events=events, keep=keep,
+                                       verify=verify)
+        deletes, keep_mtimes, errors = await engine.call(_stat_deletes, root, groups)
+        for file, error in errors:
+            events.emit('dedup.error', op='stat', file=str(file), error=str(error))
+
+    # Linked duplicates stay in place and are organized like any other file
+    excluded = [os.path.join(root, delete['path']) for delete in deletes] if dedup_action == 'delete' else []
+    if dedup_action != 'hardlink':
+        keep_mtimes = {}
+    planned = await plan_organize(engine, root, mode, state, since, classify, excluded, events)
+    moves = []
+    for src, dest, st in planned:
+        src = _relative(root, src)
+        moves.append({'src': src, 'dest': _relative(root, dest), 'size': st.st_size,
+                      'mtime_ns': keep_mtimes.get(src, st.st_mtime_ns)})
+
+    plan = {'version': PLAN_VERSION, 'created': time.time(), 'root': root, 'mode': mode,
+            'dedup_action': dedup_action, 'deletes': deletes, 'moves': moves, 'totals': _totals(moves, deletes)}
+    events.emit('plan.done', path=root, mode=mode, dedup_action=dedup_action, **plan['totals'])
+    return plan
+
+
+def save_plan(plan, plan_path):
+    tmp_path = f"{plan_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, plan_path)
+
+
+def load_plan(plan_path):
+    # Raises OSError if the file cannot be read and ValueError if it is not a plan
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        plan = json.load(f)
+    if not isinstance(plan, dict) or plan.get('version') != PLAN_VERSION:
+        raise ValueError(f"'{plan_path}' is not a version {PLAN_VERSION} plan")
+    for key in ('root', 'mode', 'moves', 'deletes'):
+        if key not in plan:
+            raise ValueError(f"'{plan_path}' is missing '{key}'")
+    return plan
+
+
+def _unchanged(path, item):
+    # Raises if the file is gone or differs from when the plan was made
+    st = os.stat(path)
+    if (st.st_size, st.st_mtime_ns) != (item['size'], item['mtime_ns']):
+        raise ValueError("changed since the plan was made")
+
+
+def _check_move(job):
+    src, dest, item = job
+    try:
+        _unchanged(src, item)
+        # os.rename would silently replace a file that appeared since planning
+        if os.path.lexists(dest):
+            raise FileExistsError(f"'{dest}' already exists")
+        return None
+    except (OSError, ValueError) as e:
+        return e
+
+
+def _delete(action, job):
+    dup, keep, item = job
+    try:
+        _unchanged(dup, item)
+        if not os.path.isfile(keep):
+            raise FileNotFoundError(f"the copy being kept, '{keep}', is gone")
+        if action == 'delete':
+            os.remove(dup)
+        else:
+            link_duplicate(keep, dup, action)
+        return None
+    except (OSError, ValueError) as e:
+        return e
+
+
+async def apply_plan(engine, plan, events=None, journal=None):
+    # Returns {'moved', 'removed', 'space_saved', 'failed'}
+    events = events or make_reporter('none')
+    root = Path(plan['root'])
+    result = {'moved': 0, 'removed': 0, 'space_saved': 0, 'failed': 0}
+
+    # Plans written before dedup actions existed only deleted
+    action = plan.get('dedup_action', 'delete')
+    deletes = [(root / item['path'], root / item['keep'], item) for item in plan['deletes']]
+    if journal is not None:
+        journal.plan_deletes(([keep, dup] for dup, keep, _ in deletes), action)
+    async for (dup, keep, item), error in engine.map_unordered(partial(_delete, action), deletes,
+                                                               chunk_size=MOVE_CHUNK):
+        if journal is not None:
+            journal.done(dup, error)
+        if error:
+            result['failed'] += 1
+            events.emit('dedup.error', op='remove' if action == 'delete' else 'link', file=str(dup),
+                        error=str(error))
+            continue
+        result['removed'] += 1
+        result['space_saved'] += item['size']
+        if action == 'delete':
+            events.emit('dedup.removed', file=str(dup), size=item['size'])
+        else:
+            events.emit('dedup.linked', file=str(dup), keep=str(keep), size=item['size'], action=action)
+
+    jobs = [(root / item['src'], root / item['dest'], item) for item in plan['moves']]
+    moves = []
+    async for (src, dest, _), error in engine.map_unordered(_check_move, jobs, chunk_size=MOVE_CHUNK):
+        if error:
+            result['failed'] += 1
+            events.emit('organize.error', file=str(src), error=str(error))
+        else:
+            moves.append((src, dest))
+
+    folders = {}
+    done = 0
+    if journal is not None:
+        journal.plan_moves(moves)
+    events.emit('progress', stage='move', path=str(root), done=0, total=len(moves))
+    async for src, dest, error in execute_moves_async(engine, moves):
+        done += 1
+        if journal is not None:
+            journal.done(src, error)
+        if error:
+            result['failed'] += 1
+            events.emit('organize.error', file=str(src), error=str(error))
+        else:
+            result['moved'] += 1
+            folders[dest.parent.name] = folders.get(dest.parent.name, 0) + 1
+        events.emit('progress', stage='move', path=str(root), done=done, total=len(moves))
+    events.emit('plan.applied', path=str(root), mode=plan['mode'], folders=folders, **result)
+    return result
@@ -0,0 +1,264 @@
+# server/planner.py
+import os
+import sys
+import time
+import errno
+import shutil
+import contextlib
+from pathlib import Path
+from .metrics import inc
+
+CASE_INSENSITIVE_NAMES = sys.platform in ('win32', 'darwin')
+
+
+def _key(name):
+    return name.casefold() if CASE_INSENSITIVE_NAMES else name
+
+
+class FolderIndex:
+    # Names already present in (or planned for) one destination folder, so
+    # conflict-free suffixes are picked in memory instead of by exists() probes.
+    def __init__(self, folder):
+        self.folder = folder
+        self.names = set()
+        self.counters = {}
+        try:
+            inc('syscalls_total', op='scandir')
+            with os.scandir(folder) as it:
+                self.names.update(_key(entry.name) for entry in it)
+        except FileNotFoundError:
+            pass
+
+    def claim(self, name, verify=False):
+        # verify re-checks the disk, for long-lived indexes that may have gone stale
+        while True:
+            dest = self._claim(name)
+            if not verify:
+                return dest
+            inc('syscalls_total', op='lstat')
+            if not os.path.lexists(dest):
+                return dest
+
+    def _claim(self, name):
+        if _key(name) not in self.names:
+            self.names.add(_key(name))
+            return self.folder / name
+        stem, suffix = os.path.splitext(name)
+        counter = self.counters.get((stem, suffix), 1)
+        while _key(f"{stem}_{counter}{suffix}") in self.names:
+            counter += 1
+        self.counters[(stem, suffix)] = counter + 1
+        unique = f"{stem}_{counter}{suffix}"
+        self.names.add(_key(unique))
+        return self.folder / unique
+
+
+def plan_moves(root, assignments, indexes=None, verify=None):
+    # assignments: iterable of (source Path, destination folder name under root).
+    # Callers may pass a dict of indexes kept across calls; names are then
+    # verified on disk unless verify=False says every move goes through them.
+    root = Path(root)
+    if verify is None:
+        verify = indexes is not None
+    if indexes is None:
+        indexes = {}
+    moves = []
+    for src, folder_name in assignments:
+        index = indexes.get(folder_name)
+        if index is None:
+            index = indexes[folder_name] = FolderIndex(root / folder_name)
+        moves.append((src, index.claim(src.name, verify)))
+    return moves
+
+
+COPY_CHUNK = 8 * 1024 * 1024
+
+
+def _copy_chunked(src, dest):
+    # Kernel-side copy where available: copy_file_range, then sendfile, then a plain buffered copy
+    copied = 0
+    inc('syscalls_total', 2, op='open')
+    with open(src, 'rb') as fsrc, open(dest, 'xb') as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        for copy in (getattr(os, 'copy_file_range', None), getattr(os, 'sendfile', None)):
+            if copy is None:
+                continue
+            try:
+                while True:
+                    inc('syscalls_total', op=copy.__name__)
+                    if copy is os.sendfile:
+                        n = os.sendfile(outfd, infd, copied, COPY_CHUNK)
+                    else:
+                        n = copy(infd, outfd, COPY_CHUNK)
+                    if n == 0:
+                        return copied
+                    copied += n
+            except OSError as e:
+                if copied or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                                             errno.ENOTSUP, errno.EBADF):
+                    raise
+        shutil.copyfileobj(fsrc, fdst, COPY_CHUNK)
+        return fdst.tell()
+
+
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1  # renameat2() flag, Linux
+RENAME_EXCL = 4       # renamex_np() flag, macOS
+# Errors meaning the kernel or filesystem lacks the no-replace rename
+NO_EXCLUSIVE_RENAME = {errno.EINVAL, errno.ENOSYS, errno.ENOTSUP, errno.EOPNOTSUPP}
+
+_exclusive_rename = []  # [function or None], looked up on first use
+
+
+def _libc_exclusive_rename():
+    # libc's renameat2(RENAME_NOREPLACE) or renamex_np(RENAME_EXCL) as
+    # f(src bytes, dest bytes) -> errno (0 on success), or None without either
+    if not _exclusive_rename:
+        func = None
+        if os.name == 'posix':
+            import ctypes  # deferred: only runs that move files pay for it
+            try:
+                libc = ctypes.CDLL(None, use_errno=True)
+            except OSError:
+                libc = None
+            if libc is not None and hasattr(libc, 'renameat2'):
+                renameat2 = libc.renameat2
+
+                def func(src, dest):
+                    return 0 if renameat2(AT_FDCWD, src, AT_FDCWD, dest, RENAME_NOREPLACE) == 0 \
+                        else ctypes.get_errno()
+            elif libc is not None and hasattr(libc, 'renamex_np'):
+                renamex_np = libc.renamex_np
+
+                def func(src, dest):
+                    return 0 if renamex_np(src, dest, RENAME_EXCL) == 0 else ctypes.get_errno()
+        _exclusive_rename.append(func)
+    return _exclusive_rename[0]
+
+
+def _rename_exclusive(src, dest):
+    # One atomic rename that never replaces dest, which fails with EEXIST instead
+    rename = _libc_exclusive_rename()
+    if rename is not None:
+        inc('syscalls_total', op='rename')
+        error = rename(os.fsencode(src), os.fsencode(dest))
+        if not error:
+            return
+        if error not in NO_EXCLUSIVE_RENAME:
+            raise OSError(error, os.strerror(error), str(src), None, str(dest))
+    # No atomic form here (Windows, old kernels, some network filesystems):
+    # check, then rename. The window between the two is small.
+    inc('syscalls_total', op='lstat')
+    if os.path.lexists(dest):
+        raise FileExistsError(errno.EEXIST, "Destination already exists", str(dest))
+    inc('syscalls_total', op='rename')
+    os.rename(src, dest)
+
+
+def _move(move):
+    # Returns (error, bytes copied); bytes is 0 for a same-device rename. A
+    # file that appeared at dest since planning is never overwritten: the move
+    # fails with FileExistsError instead.
+    src, dest, same_device = move
+    try:
+        if same_device:
+            try:
+                _rename_exclusive(src, dest)
+                return None, 0
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+        try:
+            copied = _copy_chunked(src, dest)
+            shutil.copystat(src, dest)
+        except FileExistsError:
+            # Raised by the O_EXCL open: dest is someone else's file, so it is left alone
+            raise
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(dest)
+            raise
+        inc('syscalls_total', op='unlink')
+        os.remove(src)
+        inc('bytes_copied_total', copied)
+        return None, copied
+    except Exception as e:
+        return e, 0
+
+
+def _device(path, cache):
+    if path not in cache:
+        try:
+            inc('syscalls_total', op='stat')
+            cache[path] = os.stat(path).st_dev
+        except OSError:
+            cache[path] = None
+    return cache[path]
+
+
+def prepare_moves(moves):
+    # Creates every destination folder once and tags each move with whether
+    # source and destination share a device, stat'ing each directory once.
+    for folder in {dest.parent for _, dest in moves}:
+        try:
+            inc('syscalls_total', op='mkdir')
+            folder.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            pass  # the moves into it fail and are reported individually
+    devices = {}
+    return [(src, dest, _device(src.parent, devices) == _device(dest.parent, devices))
+            for src, dest in moves]
+
+
+def _new_stats(stats):
+    if stats is None:
+        stats = {}
+    for key in ('renamed', 'copied', 'bytes_copied'):
+        stats.setdefault(key, 0)
+    stats.setdefault('copy_seconds', 0.0)
+    return stats
+
+
+def _tally(stats, same_device, error, copied):
+    if not error:
+        if same_device and not copied:
+            stats['renamed'] += 1
+        else:
+            stats['copied'] += 1
+            stats['bytes_copied'] += copied
+
+
+def execute_moves(moves, stats=None):
+    # Yields (src, dest, error) per move, one at a time in the calling thread,
+    # for single files such as the watcher's; batches go through
+    # execute_moves_async on the engine. Moves within one device are a single
+    # rename; the rest are copied and reported in stats.
+    stats = _new_stats(stats)
+    start = time.perf_counter()
+    for src, dest, same_device in prepare_moves(moves):
+        error, copied = _move((src, dest, same_device))
+        _tally(stats, same_device, error, copied)
+        yield src, dest, error
+    if stats['copied']:
+        stats['copy_seconds'] += time.perf_counter() - start
+
+
+# Same-device renames are cheap, so the async path hands them to the executor in
+# chunks; cross-device copies go one per call so large files still run in parallel
+MOVE_CHUNK = 32
+
+
+async def execute_moves_async(engine, moves, stats=None):
+    # Same as execute_moves, on the asyncio engine
+    stats = _new_stats(stats)
+    start = time.perf_counter()
+    jobs = await engine.call(prepare_moves, moves)
+    renames = [job for job in jobs if job[2]]
+    copies = [job for job in jobs if not job[2]]
+    for batch, chunk_size in ((renames, MOVE_CHUNK), (copies, 1)):
+        async for (src, dest, same_device), (error, copied) in engine.map_unordered(_move, batch,
+                                                                                     chunk_size=chunk_size):
+            _tally(stats, same_device, error, copied)
+            yield src, dest, error
+    if stats['copied']:
+        stats['copy_seconds'] += time.perf_counter() - start
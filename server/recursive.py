@@ -0,0 +1,129 @@
+# server/recursive.py
+# Recursive organizing. Every directory is an independent unit of work: a
+# pool of tasks on the engine takes directories from a shared queue, lists
+# them, queues their subdirectories and organizes their files, so a worker
+# that finishes a small subtree immediately picks up part of a large one.
+# 'flatten' moves every file into the category folders under the root;
+# 'per-folder' organizes each directory's files into folders inside it.
+# Folders the organizer creates (categories, months, size classes) are never
+# descended into, so a second run does not reorganize its own output.
+import os
+import asyncio
+import threading
+from pathlib import Path
+from .events import make_reporter
+from .metrics import phase, phase_files
+from .organizers import output_folder_names, is_output_folder, _assign, _folder_func, _ordered_counts
+from .planner import plan_moves, execute_moves_async
+from .state import select_entries
+
+LAYOUTS = ['flatten', 'per-folder']
+
+
+def _list_dir(directory, output_names, since=None):
+    # Returns (files, subdirectories to walk); symlinked directories are not followed
+    files = []
+    subdirs = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                if entry.is_file():
+                    files.append(entry)
+                elif entry.is_dir(follow_symlinks=False) and not is_output_folder(entry.name, output_names):
+                    subdirs.append(Path(entry.path))
+            except OSError:
+                continue
+    if since is not None:
+        files, _ = select_entries(files, since=since)
+    return files, subdirs
+
+
+async def organize_tree(engine, path, mode='type', layout='flatten', since=None, classify='extension',
+                        events=None, journal=None):
+    own_events = events is None
+    events = events or make_reporter()
+    root = Path(path)
+    output_names = output_folder_names()
+    # flatten: destination folders are shared by every worker, so they share
+    # one set of indexes; names are claimed under the lock
+    indexes = {}
+    index_lock = threading.Lock()
+    counts = {}
+    totals = {'files': 0, 'done': 0, 'directories': 0}
+    queue = asyncio.Queue()
+    queue.put_nowait(root)
+
+    def plan(directory, assignments):
+        if layout == 'per-folder':
+            return plan_moves(directory, assignments)
+        with index_lock:
+            return plan_moves(root, assignments, indexes, verify=False)
+
+    def progress(finished=False):
+        # The total grows while directories are still being listed
+        total = totals['files'] if finished else totals['files'] + 1
+        events.emit('progress', stage='move', path=str(root), done=totals['done'], total=total)
+
+    async def process(directory):
+        files, subdirs = await engine.call(_list_dir, directory, output_names, since)
+        for subdir in subdirs:
+            queue.put_nowait(subdir)
+        totals['directories'] += 1
+        if not files:
+            return
+        totals['files'] += len(files)
+        folder_for = await _folder_func(engine, mode, files, classify, events)
+        assignments, _, errors = await engine.call(_assign, files, folder_for)
+        for file, error in errors:
+            totals['done'] += 1
+            events.emit('organize.error', file=str(file), error=str(error))
+        moves = await engine.call(plan, directory, assignments)
+        if journal is not None:
+            journal.plan_moves(moves, commit=False)
+            await journal.sync(engine)
+        async for src, dest, error in execute_moves_async(engine, moves):
+            totals['done'] += 1
+            if journal is not None:
+                journal.done(src, error)
+            if error:
+                events.emit('organize.error', file=str(src), error=str(error))
+            else:
+                counts[dest.parent.name] = counts.get(dest.parent.name, 0) + 1
+            progress()
+
+    async def worker():
+        while True:
+            directory = await queue.get()
+            try:
+                await process(directory)
+            except Exception as e:
+                events.emit('organize.error', file=str(directory), error=str(e))
+            finally:
+                queue.task_done()
+
+    try:
+        events.emit('organize.tree', path=str(root), mode=mode, layout=layout)
+        with phase('tree'):
+            workers = [asyncio.ensure_future(worker()) for _ in range(engine.concurrency)]
+            try:
+                await queue.join()
+            except asyncio.CancelledError:
+                events.emit('organize.cancelled', path=str(root), done=totals['done'], total=totals['files'])
+                raise
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        phase_files('tree', totals['files'])
+
+        if not totals['files']:
+            events.emit('organize.empty', path=str(root))
+            return {}
+        progress(finished=True)
+        counts = _ordered_counts(mode, counts)
+        events.emit('organize.done', path=str(root), mode=mode, files_organized=sum(counts.values()),
+                    folders=counts, directories=totals['directories'])
+        return counts
+    finally:
+        if own_events:
+            events.close()
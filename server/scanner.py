@@ -0,0 +1,41 @@
+# server/scanner.py
+# Kept free of package-relative imports so the standalone file_organizer.py can use it too.
+import os
+from fnmatch import fnmatch
+
+
+def _excluded(entry, rel_path, exclude):
+    return any(fnmatch(entry.name, pattern) or fnmatch(rel_path, pattern) for pattern in exclude)
+
+
+def scan_entries(path, recursive=False, max_depth=None, exclude=None, follow_symlinks=True):
+    # Yields os.DirEntry objects for regular files, lazily. is_file() comes from
+    # the directory listing and entry.stat() is cached, so callers that need the
+    # size/mtime pay for at most one stat per file.
+    exclude = list(exclude or [])
+    if not recursive:
+        max_depth = 0
+    stack = [(os.fspath(path), '', 0)]
+
+    while stack:
+        directory, rel_dir, depth = stack.pop()
+        try:
+            iterator = os.scandir(directory)
+        except OSError:
+            continue
+        with iterator:
+            for entry in iterator:
+                rel_path = f"{rel_dir}{entry.name}"
+                if exclude and _excluded(entry, rel_path, exclude):
+                    continue
+                try:
+                    if entry.is_file(follow_symlinks=follow_symlinks):
+                        yield entry
+                    elif (max_depth is None or depth < max_depth) and entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, f"{rel_path}/", depth + 1))
+                except OSError:
+                    continue
+
+
+def count_files(path, **kwargs):
+    return sum(1 for _ in scan_entries(path, **kwargs))
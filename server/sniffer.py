@@ -0,0 +1,94 @@
+# server/sniffer.py
+import os
+import threading
+from .config import SIGNATURES
+from .metrics import inc
+
+MEMO_LIMIT = 100000
+
+CANDIDATES = None  # trie key holding the signatures that end at a node
+
+
+def _build_tries(signatures):
+    # One byte-prefix trie per start offset; header_size covers every signature and check
+    tries = {}
+    header_size = 0
+    for signature in signatures:
+        offset = signature.get('offset', 0)
+        magic = bytes.fromhex(signature['hex'])
+        also = tuple((at, bytes.fromhex(value)) for at, value in signature.get('also', []))
+        node = tries.setdefault(offset, {})
+        for byte in magic:
+            node = node.setdefault(byte, {})
+        node.setdefault(CANDIDATES, []).append((also, signature['ext']))
+        header_size = max(header_size, offset + len(magic),
+                          *(at + len(value) for at, value in also))
+    return tries, header_size
+
+
+class ContentSniffer:
+    # Maps a file's leading bytes to a representative extension (e.g. ".png"),
+    # which the category index then turns into the user's category. Signatures
+    # marked "container" (zip, OLE, ISO media) are shared by many formats, such
+    # as docx, xlsx, jar or m4a, so their extensions are only a format family.
+    def __init__(self, signatures=SIGNATURES):
+        self.tries, self.header_size = _build_tries(signatures)
+        self.containers = frozenset(signature['ext'] for signature in signatures if signature.get('container'))
+        self.memo = {}
+        self.lock = threading.Lock()
+
+    def match(self, header):
+        best_depth, best_ext = 0, None
+        for offset, node in self.tries.items():
+            depth = 0
+            for byte in header[offset:]:
+                node = node.get(byte)
+                if node is None:
+                    break
+                depth += 1
+                if depth > best_depth:
+                    for also, ext in node.get(CANDIDATES, ()):
+                        if all(header[at:at + len(value)] == value for at, value in also):
+                            best_depth, best_ext = depth, ext
+                            break
+        return best_ext
+
+    def read_header(self, path):
+        inc('syscalls_total', op='open')
+        inc('syscalls_total', op='read')
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            return os.read(fd, self.header_size)
+        finally:
+            os.close(fd)
+
+    def sniff(self, entry):
+        # entry: os.DirEntry or Path. Results are memoized per (dev, inode, size, mtime_ns).
+        # A file that vanished or cannot be read gets None, like an unknown one.
+        try:
+            st = entry.stat()
+        except OSError:
+            return None
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) if st.st_ino else None
+        if key is not None and key in self.memo:
+            return self.memo[key]
+        try:
+            ext = self.match(self.read_header(entry.path if hasattr(entry, 'path') else entry))
+        except OSError:
+            return None
+        if key is not None:
+            with self.lock:
+                if len(self.memo) >= MEMO_LIMIT:
+                    self.memo.clear()
+                self.memo[key] = ext
+        return ext
+
+
+_sniffer = None
+
+
+def get_sniffer():
+    global _sniffer
+    if _sniffer is None:
+        _sniffer = ContentSniffer()
+    return _sniffer
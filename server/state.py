@@ -0,0 +1,82 @@
+# server/state.py
+import os
+import json
+from datetime import datetime
+from .config import STATE_PATH
+
+
+def parse_since(value, state=None):
+    # Accepts epoch seconds, an ISO date/time, or 'last' for the previous recorded run
+    if value is None:
+        return None
+    if value == 'last':
+        return state.last_run if state is not None else None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+class OrganizerState:
+    # Per-root record of what a run processed: name -> [size, mtime_ns,
+    # destination, dev, inode], destination None when the file stayed in the
+    # root. Only entries seen in the latest run are kept, so the file stays small.
+    def __init__(self, root, state_path=STATE_PATH):
+        self.root = os.path.abspath(root)
+        self.state_path = state_path
+        self.seen = {}
+        data = self._load()
+        root_state = data.get(self.root, {})
+        self.entries = root_state.get('entries', {})
+        self.last_run = root_state.get('last_run')
+
+    def _load(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def is_unchanged(self, entry):
+        # Only the very file the last run left in the root (same device, inode,
+        # size and mtime) is skipped. A recorded destination means that file was
+        # moved out, so whatever has the name now arrived since, even a copy with
+        # the same size and mtime; a failed move is tried again.
+        record = self.entries.get(entry.name)
+        if record is None or record[2] is not None or len(record) < 6 or record[5]:
+            return False
+        st = entry.stat()
+        if record[:2] != [st.st_size, st.st_mtime_ns] or record[3:5] != [st.st_dev, st.st_ino]:
+            return False
+        self.seen[entry.name] = record
+        return True
+
+    def record(self, name, st, dest, failed=False):
+        self.seen[name] = [st.st_size, st.st_mtime_ns, str(dest) if dest else None, st.st_dev, st.st_ino, failed]
+
+    def save(self, run_started):
+        data = self._load()
+        data[self.root] = {'last_run': run_started, 'entries': self.seen}
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+
+def select_entries(entries, state=None, since=None):
+    # Filters scanned entries down to new or changed files; returns (selected, skipped count)
+    selected = []
+    skipped = 0
+    for entry in entries:
+        try:
+            if since is not None and entry.stat().st_mtime < since:
+                skipped += 1
+                continue
+            if state is not None and state.is_unchanged(entry):
+                skipped += 1
+                continue
+        except OSError:
+            continue
+        selected.append(entry)
+    return selected, skipped
@@ -1,5 +1,8 @@
-from colorama import Fore, Style
+import json
 from datetime import datetime
+from pathlib import Path
+from colorama import Fore, Style
+from .utils import format_file_size
 
 LOGO = r"""
  ╔════════════════════════════════════════════════════════════════╗
@@ -17,4 +20,285 @@ def print_header():
     print(f"{Fore.CYAN}{LOGO}")
     print(f"{Fore.GREEN}{'='*70}")
     print(f"{Fore.YELLOW}[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Starting File Organizer")
-    print(f"{Fore.GREEN}{'='*70}\n")
\ No newline at end of file
+    print(f"{Fore.GREEN}{'='*70}\n")
+
+
+BAR_FORMAT = f"{Fore.BLUE}{{l_bar}}{Fore.CYAN}{{bar}} {Fore.GREEN}{{n_fmt}}/{Fore.GREEN}{{total_fmt}} [{Fore.YELLOW}{{elapsed}}<{Fore.YELLOW}{{remaining}}] {Fore.MAGENTA}{{percentage:3.0f}}%"
+
+MODE_TITLES = {
+    'type': ("type", "category"),
+    'date': ("creation date", "month"),
+    'size': ("size", "size category"),
+}
+
+PROGRESS_TITLES = {
+    'edge_hash': "Hashing file edges",
+    'full_hash': "Hashing files",
+    'verify': "Verifying duplicates",
+    'image_hash': "Hashing images",
+    'move': "Moving files",
+}
+
+STAGE_TITLES = {
+    'size': "Size grouping",
+    'edge_hash': "Edge hashing",
+    'full_hash': "Full hashing",
+    'verify': "Byte comparison",
+    'image_hash': "Perceptual hashing",
+}
+
+DEDUP_ERRORS = {
+    'stat': "Failed to stat",
+    'hash': "Failed to hash",
+    'verify': "Failed to verify",
+    'remove': "Failed to remove",
+    'link': "Failed to link",
+}
+LINK_TITLES = {'hardlink': "hard link", 'reflink': "reflink"}
+
+
+class TerminalSink:
+    # Renders events as the coloured console output and tqdm progress bars;
+    # events without a renderer are ignored.
+    def __init__(self):
+        self.bars = {}
+        self.remove_duplicates = False
+
+    def emit(self, event):
+        render = getattr(self, '_' + event['event'].replace('.', '_'), None)
+        if render is not None:
+            render(event)
+
+    def close(self):
+        for bar in self.bars.values():
+            bar.close()
+        self.bars.clear()
+
+    def _progress(self, event):
+        key = (event['stage'], event.get('path'))
+        bar = self.bars.get(key)
+        if bar is None:
+            from tqdm import tqdm  # deferred: importing tqdm costs more than the rest of startup
+            title = PROGRESS_TITLES.get(event['stage'], event['stage'])
+            bar = self.bars[key] = tqdm(total=event['total'], desc=f"{Fore.WHITE}{title}", bar_format=BAR_FORMAT)
+        if bar.total != event['total']:
+            bar.total = event['total']  # recursive runs keep finding files
+        bar.update(event['done'] - bar.n)
+        if event['done'] >= event['total']:
+            bar.close()
+            del self.bars[key]
+
+    # --- __main__
+
+    def _run_start(self, event):
+        self.remove_duplicates = event['remove_duplicates']
+        print_header()
+        print(f"{Fore.WHITE}Directory: {Fore.GREEN}{event['path']}")
+        print(f"{Fore.WHITE}Mode: {Fore.GREEN}{event['mode']}")
+        print(f"{Fore.WHITE}Remove Duplicates: {Fore.GREEN}{event['remove_duplicates']}")
+        print()
+
+    def _run_startup(self, event):
+        print(f"{Fore.CYAN}[STARTUP] Import timings:")
+        for name, ms in event['timings'].items():
+            print(f"{Fore.YELLOW}  - {name}: {ms:.1f} ms")
+        print(f"{Fore.CYAN}[STARTUP] Ready after {event['ready_ms']:.1f} ms")
+
+    def _run_error(self, event):
+        print(f"{Fore.RED}[ERROR] {event['message']}")
+
+    def _run_summary(self, event):
+        stats = {key: event[key] for key in ('files_organized', 'duplicates_removed', 'space_saved', 'time_taken')}
+        # The desktop app parses this line
+        print(json.dumps(stats))
+
+        print(f"\n{Fore.GREEN}{'='*70}")
+        print(f"{Fore.YELLOW}[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Operation completed")
+        print(f"{Fore.CYAN}Total time: {stats['time_taken']:.2f} seconds")
+        if self.remove_duplicates:
+            print(f"{Fore.CYAN}Duplicates removed: {stats['duplicates_removed']}")
+            print(f"{Fore.CYAN}Space saved: {format_file_size(stats['space_saved'])}")
+        print(f"{Fore.GREEN}{'='*70}")
+        print(f"{Fore.GREEN}[✓] All tasks completed successfully!")
+
+    def _run_metrics(self, event):
+        print(f"{Fore.CYAN}[STATS] Phases:")
+        for name, phase in event['phases'].items():
+            rate = f", {phase['files_per_second']:.0f} files/s" if phase['files_per_second'] else ''
+            print(f"{Fore.YELLOW}  - {name}: {phase['files']} files in {phase['seconds']:.3f} s{rate}")
+        if event['counters']:
+            print(f"{Fore.CYAN}[STATS] Counters:")
+            for name, value in event['counters'].items():
+                print(f"{Fore.YELLOW}  - {name}: {value:g}")
+        if event['histograms']:
+            print(f"{Fore.CYAN}[STATS] Latencies:")
+            for name, h in event['histograms'].items():
+                print(f"{Fore.YELLOW}  - {name}: n={h['count']} p50={h['p50'] * 1000:.2f} ms "
+                      f"p95={h['p95'] * 1000:.2f} ms max={h['max'] * 1000:.2f} ms")
+
+    def _run_cancelled(self, event):
+        print(f"\n\n{Fore.YELLOW}[!] Operation cancelled by user")
+        print(f"{Fore.GREEN}[✓] Exiting gracefully...")
+
+    def _run_failed(self, event):
+        print(f"\n{Fore.RED}[CRITICAL ERROR] {event['error']}")
+
+    # --- organizers
+
+    def _organize_empty(self, event):
+        print(f"{Fore.YELLOW}[!] No files found in {event['path']}")
+
+    def _organize_skipped(self, event):
+        print(f"{Fore.CYAN}[+] Skipping {event['skipped']} unchanged files")
+
+    def _organize_start(self, event):
+        print(f"{Fore.CYAN}[+] Organizing {event['files']} files by {MODE_TITLES[event['mode']][0]}...")
+
+    def _organize_tree(self, event):
+        layout = "into one set of folders" if event['layout'] == 'flatten' else "within each folder"
+        print(f"{Fore.CYAN}[+] Organizing {event['path']} recursively by {MODE_TITLES[event['mode']][0]}, {layout}...")
+
+    def _organize_classified(self, event):
+        print(f"{Fore.CYAN}[+] Classified {event['sniffed']} of {event['candidates']} sniffed files by content")
+
+    def _organize_error(self, event):
+        print(f"\n{Fore.RED}[ERROR] Error moving {event['file']}: {event['error']}")
+
+    def _organize_cancelled(self, event):
+        print(f"\n{Fore.YELLOW}[!] Cancelled after {event['done']} of {event['total']} moves in {event['path']}")
+
+    def _organize_copied(self, event):
+        rate = event['bytes_copied'] / max(event['seconds'], 1e-9)
+        print(f"{Fore.CYAN}[STATS] Copied {event['copied']} files across devices "
+              f"({format_file_size(event['bytes_copied'])} at {format_file_size(int(rate))}/s)")
+
+    def _organize_done(self, event):
+        print(f"\n{Fore.GREEN}[✓] Files organized by {event['mode']}")
+        print(f"{Fore.CYAN}[SUMMARY] Files organized by {MODE_TITLES[event['mode']][1]}:")
+        for folder, count in event['folders'].items():
+            print(f"{Fore.YELLOW}  - {folder}: {count} files")
+
+    # --- duplicate_remover
+
+    def _dedup_start(self, event):
+        print(f"{Fore.CYAN}[+] Scanning {event['path']} for duplicates...")
+
+    def _dedup_empty(self, event):
+        print(f"{Fore.YELLOW}[!] No files found")
+
+    def _dedup_stage(self, event):
+        before, after = event['before'], event['after']
+        print(f"{Fore.CYAN}[STAGE] {STAGE_TITLES[event['stage']]}: {before} -> {after} candidates "
+              f"({before - after} eliminated)")
+
+    def _dedup_cache(self, event):
+        print(f"{Fore.CYAN}[STAGE] Hash cache: {event['hits']} hits, {event['misses']} misses")
+
+    def _dedup_error(self, event):
+        print(f"{Fore.RED}[ERROR] {DEDUP_ERRORS[event['op']]} {event['file']}: {event['error']}")
+
+    def _dedup_removed(self, event):
+        print(f"{Fore.YELLOW}[-] Removed duplicate: {Path(event['file']).name} "
+              f"(Size: {format_file_size(event['size'])})")
+
+    def _dedup_linked(self, event):
+        print(f"{Fore.YELLOW}[=] Linked duplicate: {Path(event['file']).name} -> {Path(event['keep']).name} "
+              f"({LINK_TITLES[event['action']]}, saved {format_file_size(event['size'])})")
+
+    def _dedup_done(self, event):
+        action = event.get('action', 'delete')
+        if event['duplicates_removed'] > 0 and action != 'delete':
+            print(f"\n{Fore.GREEN}[✓] Replaced {event['duplicates_removed']} duplicates with "
+                  f"{LINK_TITLES[action]}s, saved {format_file_size(event['space_saved'])}")
+        elif event['duplicates_removed'] > 0:
+            print(f"\n{Fore.GREEN}[✓] Removed {event['duplicates_removed']} duplicates, "
+                  f"saved {format_file_size(event['space_saved'])}")
+        else:
+            print(f"\n{Fore.GREEN}[✓] No duplicates found")
+
+    def _dedup_similar(self, event):
+        print(f"{Fore.CYAN}[~] Looks like {event['keep']}:")
+        for file in event['files']:
+            print(f"{Fore.YELLOW}  - {file['file']} ({format_file_size(file['size'])}, "
+                  f"{file['distance']} bits apart)")
+
+    def _dedup_similar_done(self, event):
+        if event['groups']:
+            print(f"\n{Fore.GREEN}[✓] Found {event['files']} near duplicates in {event['groups']} groups, "
+                  f"{format_file_size(event['space'])} if removed; nothing was changed")
+        else:
+            print(f"\n{Fore.GREEN}[✓] No near duplicates found")
+
+    # --- plan
+
+    def _plan_done(self, event):
+        print(f"\n{Fore.GREEN}[✓] Dry run: nothing was changed")
+        action = event.get('dedup_action', 'delete')
+        if event['deletes'] and action != 'delete':
+            print(f"{Fore.CYAN}[PLAN] Would replace {event['deletes']} duplicates with {LINK_TITLES[action]}s "
+                  f"({format_file_size(event['delete_bytes'])})")
+        elif event['deletes']:
+            print(f"{Fore.CYAN}[PLAN] Would remove {event['deletes']} duplicates "
+                  f"({format_file_size(event['delete_bytes'])})")
+        print(f"{Fore.CYAN}[PLAN] Would move {event['moves']} files ({format_file_size(event['move_bytes'])}):")
+        for folder, totals in event['destinations'].items():
+            print(f"{Fore.YELLOW}  - {folder}: {totals['files']} files, {format_file_size(totals['bytes'])}")
+
+    def _plan_written(self, event):
+        print(f"{Fore.GREEN}[✓] Plan written to {event['file']}")
+
+    def _plan_applied(self, event):
+        print(f"\n{Fore.GREEN}[✓] Plan applied: {event['moved']} moved, {event['removed']} removed, "
+              f"{event['failed']} skipped or failed")
+        for folder, count in event['folders'].items():
+            print(f"{Fore.YELLOW}  - {folder}: {count} files")
+
+    # --- journal
+
+    def _journal_nothing(self, event):
+        print(f"{Fore.YELLOW}[!] Nothing to {event['action']} for {event['path']}")
+
+    def _journal_resume(self, event):
+        print(f"{Fore.CYAN}[+] Resuming: {event['already_done']} of {event['planned']} planned operations "
+              f"had completed, {event['todo']} left")
+
+    def _journal_resumed(self, event):
+        print(f"\n{Fore.GREEN}[✓] Resumed run finished: {event['completed']} completed, {event['failed']} failed")
+
+    def _journal_undo(self, event):
+        print(f"{Fore.CYAN}[+] Undoing {event['operations']} operations in {event['path']}...")
+
+    def _journal_undone(self, event):
+        if event['failed']:
+            print(f"\n{Fore.YELLOW}[!] Restored {event['restored']} files; {event['failed']} could not be "
+                  f"restored (run --undo again after fixing them)")
+        else:
+            print(f"\n{Fore.GREEN}[✓] Restored {event['restored']} files")
+
+    def _journal_error(self, event):
+        print(f"{Fore.RED}[ERROR] {event['file']}: {event['error']}")
+
+    # --- watcher
+
+    def _watch_start(self, event):
+        print(f"{Fore.CYAN}[+] Starting watcher on {event['path']} with mode {event['mode']}")
+
+    def _watch_detected(self, event):
+        print(f"{Fore.CYAN}[+] New file detected: {Path(event['file']).name}")
+
+    def _watch_organized(self, event):
+        print(f"{Fore.GREEN}[✓] Organized {Path(event['file']).name} -> {Path(event['dest']).parent.name}")
+
+    def _watch_error(self, event):
+        print(f"{Fore.RED}[ERROR] Error moving {event['file']}: {event['error']}")
+
+    def _watch_stop(self, event):
+        print(f"{Fore.YELLOW}[!] Watcher stopped")
+
+    def _watch_metrics(self, event):
+        text = (f"queue={event['queue']} in_flight={event['in_flight']} organized={event['organized']} "
+                f"failed={event['failed']} coalesced={event['coalesced']}")
+        if event.get('latency_avg') is not None:
+            text += (f" latency avg={event['latency_avg']:.2f}s "
+                     f"p95={event['latency_p95']:.2f}s max={event['latency_max']:.2f}s")
+        print(f"{Fore.CYAN}[METRICS] {text}")
@@ -1,59 +1,248 @@
 # server/watcher.py
+import os
 import sys
 import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from .organizers import organize_by_type, organize_by_date, organize_by_size
+from .organizers import organize_file
+from .config import WATCHER_SETTINGS
+from .events import make_reporter
+from .metrics import inc, observe
 from colorama import Fore
 
+QUIET_PERIOD = WATCHER_SETTINGS.get('quiet_period', 2.0)
+QUEUE_SIZE = WATCHER_SETTINGS.get('queue_size', 10000)
+BATCH_SIZE = WATCHER_SETTINGS.get('batch_size', 64)
+WORKERS = WATCHER_SETTINGS.get('workers', 4)
+METRICS_INTERVAL = WATCHER_SETTINGS.get('metrics_interval', 30)
+
+
+class PendingFile:
+    __slots__ = ('first_seen', 'last_event', 'size', 'mtime_ns', 'stable_since')
+
+    def __init__(self, now):
+        self.first_seen = now
+        self.last_event = now
+        self.size = None
+        self.mtime_ns = None
+        self.stable_since = None
+
+
+class WatcherMetrics:
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.organized = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.in_flight = 0
+
+    def record(self, latency, ok):
+        inc('watcher_files_total', result='organized' if ok else 'failed')
+        if ok:
+            observe('watcher_latency_seconds', latency)
+        with self.lock:
+            if ok:
+                self.organized += 1
+                self.latencies.append(latency)
+            else:
+                self.failed += 1
+
+    def snapshot(self, queue_depth):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            snapshot = {'queue': queue_depth, 'in_flight': self.in_flight, 'organized': self.organized,
+                        'failed': self.failed, 'coalesced': self.coalesced,
+                        'latency_avg': None, 'latency_p95': None, 'latency_max': None}
+            if latencies:
+                snapshot['latency_avg'] = sum(latencies) / len(latencies)
+                snapshot['latency_p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                snapshot['latency_max'] = latencies[-1]
+            return snapshot
+
+
+class EventQueue:
+    # Coalesces events per path and releases a path once its size and mtime
+    # have stayed unchanged for quiet_period seconds after the last event.
+    def __init__(self, organize, quiet_period=QUIET_PERIOD, maxsize=QUEUE_SIZE,
+                 batch_size=BATCH_SIZE, workers=WORKERS, metrics=None):
+        self.organize = organize
+        self.quiet_period = quiet_period
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.metrics = metrics or WatcherMetrics()
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.stopped = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.dispatcher = threading.Thread(target=self._run, name="watcher-dispatch", daemon=True)
+
+    def start(self):
+        self.dispatcher.start()
+
+    def stop(self):
+        self.stopped.set()
+        with self.condition:
+            self.condition.notify_all()
+        self.dispatcher.join()
+        self.executor.shutdown(wait=True)
+
+    def depth(self):
+        with self.condition:
+            return len(self.pending)
+
+    def push(self, path):
+        now = time.monotonic()
+        with self.condition:
+            pending = self.pending.get(path)
+            if pending is not None:
+                pending.last_event = now
+                self.metrics.coalesced += 1
+                inc('watcher_events_coalesced_total')
+                return
+            # Back-pressure on the observer thread instead of growing without bound
+            while len(self.pending) >= self.maxsize and not self.stopped.is_set():
+                self.condition.wait(0.5)
+            self.pending[path] = PendingFile(now)
+            self.condition.notify()
+
+    def discard(self, path):
+        with self.condition:
+            self.pending.pop(path, None)
+            self.condition.notify_all()
+
+    def _ready(self, now):
+        ready = []
+        with self.condition:
+            candidates = [(path, pending) for path, pending in self.pending.items()
+                          if now - pending.last_event >= self.quiet_period]
+        for path, pending in candidates:
+            try:
+                st = os.stat(path)
+            except OSError:
+                self.discard(path)
+                continue
+            unchanged = (st.st_size, st.st_mtime_ns) == (pending.size, pending.mtime_ns)
+            if unchanged and now - pending.stable_since >= self.quiet_period:
+                ready.append((path, pending.first_seen))
+            elif not unchanged:
+                pending.size, pending.mtime_ns = st.st_size, st.st_mtime_ns
+                pending.stable_since = now
+                # An mtime already older than the quiet period needs no second look
+                if time.time_ns() - st.st_mtime_ns >= self.quiet_period * 1e9:
+                    ready.append((path, pending.first_seen))
+        if ready:
+            with self.condition:
+                for path, _ in ready:
+                    self.pending.pop(path, None)
+                self.condition.notify_all()
+        return ready
+
+    def _run(self):
+        tick = min(self.quiet_period / 4, 0.5) or 0.05
+        while not self.stopped.is_set():
+            with self.condition:
+                if not self.pending:
+                    self.condition.wait(tick)
+            ready = self._ready(time.monotonic())
+            for i in range(0, len(ready), self.batch_size):
+                batch = ready[i:i + self.batch_size]
+                with self.metrics.lock:
+                    self.metrics.in_flight += len(batch)
+                self.executor.submit(self._dispatch, batch)
+            self.stopped.wait(tick)
+
+    def _dispatch(self, batch):
+        for path, first_seen in batch:
+            ok = self.organize(path)
+            with self.metrics.lock:
+                self.metrics.in_flight -= 1
+            self.metrics.record(time.monotonic() - first_seen, ok)
+
+
 class NewFileHandler(FileSystemEventHandler):
-    def __init__(self, mode, directory):
+    def __init__(self, mode, directory, quiet_period=QUIET_PERIOD, events=None):
         super().__init__()
         self.mode = mode
         self.directory = Path(directory)
+        # Emitted from observer and worker threads, so sinks must be thread-safe
+        self.events = events or make_reporter()
+        self.indexes = {}
+        self.index_lock = threading.Lock()
+        self.queue = EventQueue(self._organize_file, quiet_period)
 
     def on_created(self, event):
         if not event.is_directory:
             file_path = Path(event.src_path)
-            print(f"{Fore.CYAN}[+] New file detected: {file_path.name}")
-            # Organize only the new file
-            if self.mode == 'type':
-                self._organize_file(file_path, organize_by_type)
-            elif self.mode == 'date':
-                self._organize_file(file_path, organize_by_date)
-            elif self.mode == 'size':
-                self._organize_file(file_path, organize_by_size)
-
-    def _organize_file(self, file_path, organize_func):
-        # Temporarily adjust the function to work with a single file
-        files = [f for f in self.directory.iterdir() if f.is_file()]
-        original_files = set(files)
-        organize_func(self.directory)
-        new_files = set(f for f in self.directory.iterdir() if f.is_file())
-        if new_files != original_files:
-            print(f"{Fore.GREEN}[✓] Organized {file_path.name}")
-
-def start_watcher(directory, mode):
-    print(f"{Fore.CYAN}[+] Starting watcher on {directory} with mode {mode}")
-    event_handler = NewFileHandler(mode, directory)
+            if file_path.parent == self.directory:
+                self.events.emit('watch.detected', path=str(self.directory), file=str(file_path))
+            self._enqueue(file_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._enqueue(Path(event.src_path))
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.queue.discard(Path(event.src_path))
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.queue.discard(Path(event.src_path))
+            self._enqueue(Path(event.dest_path))
+
+    def _enqueue(self, file_path):
+        if file_path.parent == self.directory:
+            self.queue.push(file_path)
+
+    def _organize_file(self, file_path):
+        # Only the file from the event is classified and moved
+        if not file_path.is_file():
+            return False
+        try:
+            dest = organize_file(self.directory, file_path, self.mode, self.indexes, self.index_lock)
+            self.events.emit('watch.organized', path=str(self.directory), file=str(file_path), dest=str(dest))
+            return True
+        except Exception as e:
+            self.events.emit('watch.error', path=str(self.directory), file=str(file_path), error=str(e))
+            return False
+
+def start_watcher(directory, mode, quiet_period=QUIET_PERIOD, output='terminal'):
+    events = make_reporter(output)
+    events.emit('watch.start', path=str(directory), mode=mode)
+    event_handler = NewFileHandler(mode, directory, quiet_period, events)
+    metrics = event_handler.queue.metrics
+    event_handler.queue.start()
     observer = Observer()
     observer.schedule(event_handler, directory, recursive=False)
     observer.start()
+    last_report = (0, 0)
     try:
         while True:
-            time.sleep(1)
+            time.sleep(METRICS_INTERVAL)
+            activity = (metrics.organized + metrics.failed, event_handler.queue.depth())
+            if activity != last_report:
+                events.emit('watch.metrics', path=str(directory), **metrics.snapshot(activity[1]))
+                last_report = activity
     except KeyboardInterrupt:
         observer.stop()
-        print(f"{Fore.YELLOW}[!] Watcher stopped")
+        events.emit('watch.stop', path=str(directory))
     observer.join()
+    event_handler.queue.stop()
+    events.emit('watch.metrics', path=str(directory), **metrics.snapshot(event_handler.queue.depth()))
+    events.close()
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print(f"{Fore.RED}[ERROR] Usage: python -m server.watcher <directory> <mode>")
+    if len(sys.argv) not in (3, 4):
+        print(f"{Fore.RED}[ERROR] Usage: python -m server.watcher <directory> <mode> [quiet_seconds]")
         sys.exit(1)
     directory, mode = sys.argv[1], sys.argv[2]
     if mode not in ['type', 'date', 'size']:
         print(f"{Fore.RED}[ERROR] Invalid mode. Use: type, date, size")
         sys.exit(1)
-    start_watcher(directory, mode)
\ No newline at end of file
+    quiet_period = float(sys.argv[3]) if len(sys.argv) == 4 else QUIET_PERIOD
+    start_watcher(directory, mode, quiet_period)
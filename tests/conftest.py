@@ -0,0 +1,12 @@
+# Points settings, state, journals and the hash cache at a scratch directory
+# before the server package reads them at import time.
+import os
+import sys
+import tempfile
+
+SCRATCH = tempfile.mkdtemp(prefix='organizer-tests-')
+os.environ['SETTINGS_PATH'] = os.path.join(SCRATCH, 'settings.json')
+os.environ['ORGANIZER_STATE_PATH'] = os.path.join(SCRATCH, 'organizer_state.json')
+os.environ['ORGANIZER_JOURNAL_DIR'] = os.path.join(SCRATCH, 'journals')
+os.environ['HASH_CACHE_PATH'] = os.path.join(SCRATCH, 'hash_cache.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
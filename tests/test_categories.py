@@ -0,0 +1,20 @@
+from server.categories import CategoryIndex, OTHERS_CATEGORY
+
+
+def test_earlier_pattern_beats_later_suffix():
+    index = CategoryIndex({'Reports': ['report-*'], 'Documents': ['.pdf']})
+    assert index.classify('report-2024.pdf') == 'Reports'
+    assert index.classify('invoice.pdf') == 'Documents'
+
+
+def test_earlier_suffix_beats_later_pattern():
+    index = CategoryIndex({'Documents': ['.pdf'], 'Reports': ['re:^report-']})
+    assert index.classify('report-2024.pdf') == 'Documents'
+    assert index.classify('report-2024.txt') == 'Reports'
+
+
+def test_longest_suffix_and_case_folding():
+    index = CategoryIndex({'Archives': ['.gz'], 'Backups': ['.TAR.GZ']})
+    assert index.classify('site.tar.gz') == 'Backups'
+    assert index.classify('notes.GZ') == 'Archives'
+    assert index.classify('.gz') == OTHERS_CATEGORY
@@ -0,0 +1,36 @@
+import zipfile
+from server.categories import get_category_index
+from server.engine import run
+from server.events import make_reporter
+from server.organizers import organize
+
+
+def write_zip(path, member):
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr(member, 'content')
+
+
+def organize_by_content(root):
+    run(lambda engine: organize(engine, root, 'type', classify='content', events=make_reporter('none')))
+
+
+def folder_of(root, name):
+    return next(root.glob(f'*/{name}')).parent.name
+
+
+def test_office_files_keep_their_category(tmp_path):
+    write_zip(tmp_path / 'letter.docx', 'word/document.xml')
+    write_zip(tmp_path / 'budget.xlsx', 'xl/workbook.xml')
+    organize_by_content(tmp_path)
+    documents = get_category_index().classify('x.docx')
+    assert folder_of(tmp_path, 'letter.docx') == documents
+    assert folder_of(tmp_path, 'budget.xlsx') == documents
+
+
+def test_zip_without_extension_is_an_archive(tmp_path):
+    write_zip(tmp_path / 'download', 'readme.txt')
+    (tmp_path / 'picture').write_bytes(bytes.fromhex('89504E470D0A1A0A') + b'\0' * 16)
+    organize_by_content(tmp_path)
+    index = get_category_index()
+    assert folder_of(tmp_path, 'download') == index.classify('x.zip')
+    assert folder_of(tmp_path, 'picture') == index.classify('x.png')
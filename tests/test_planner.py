@@ -0,0 +1,22 @@
+from server.planner import execute_moves, plan_moves
+
+
+def test_move_never_replaces_a_file_that_appeared_after_planning(tmp_path):
+    (tmp_path / 'a.txt').write_text('mine')
+    moves = plan_moves(tmp_path, [(tmp_path / 'a.txt', 'Docs')])
+    (tmp_path / 'Docs').mkdir()
+    (tmp_path / 'Docs' / 'a.txt').write_text('theirs')
+
+    [(src, dest, error)] = execute_moves(moves)
+    assert isinstance(error, FileExistsError)
+    assert dest.read_text() == 'theirs'
+    assert src.read_text() == 'mine'
+
+
+def test_move_is_a_rename(tmp_path):
+    (tmp_path / 'a.txt').write_text('mine')
+    inode = (tmp_path / 'a.txt').stat().st_ino
+    stats = {}
+    [(src, dest, error)] = execute_moves(plan_moves(tmp_path, [(tmp_path / 'a.txt', 'Docs')]), stats)
+    assert error is None and not src.exists()
+    assert dest.stat().st_ino == inode and stats['renamed'] == 1
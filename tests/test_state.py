@@ -0,0 +1,41 @@
+import os
+import shutil
+from server.engine import run
+from server.events import make_reporter
+from server.organizers import organize
+from server.state import OrganizerState
+
+
+def organize_incremental(root, state_path):
+    state = OrganizerState(root, str(state_path))
+    counts = run(lambda engine: organize(engine, root, 'type', state, events=make_reporter('none')))
+    state.save(0)
+    return sum(counts.values())
+
+
+def test_copy_under_a_moved_name_is_organized(tmp_path):
+    root = tmp_path / 'root'
+    root.mkdir()
+    (root / 'report.txt').write_text('first')
+    state_path = tmp_path / 'state.json'
+    assert organize_incremental(root, state_path) == 1
+
+    # Same name, size and mtime as the file that was moved away
+    moved = next(root.glob('*/report.txt'))
+    shutil.copy2(moved, root / 'report.txt')
+    assert organize_incremental(root, state_path) == 1
+    assert not (root / 'report.txt').exists()
+    assert (moved.parent / 'report_1.txt').exists()
+
+
+def test_failed_move_is_retried(tmp_path):
+    root = tmp_path / 'root'
+    root.mkdir()
+    (root / 'notes.txt').write_text('notes')
+    state_path = tmp_path / 'state.json'
+    state = OrganizerState(root, str(state_path))
+    state.record('notes.txt', os.stat(root / 'notes.txt'), None, failed=True)
+    state.save(0)
+
+    assert organize_incremental(root, state_path) == 1
+    assert not (root / 'notes.txt').exists()